@@ -0,0 +1,339 @@
+import sys
+from array import array
+
+from instruction import BRANCH_INSTS, ISA, Instruction
+
+# default execution clocks per opcode, `.clock` directives override them
+CLOCKS = {name: clock for name, clock in zip(ISA.names, ISA.latency) if clock is not None}
+
+
+class AssemblerError(Exception):
+    def __init__(self, message, line_number=None):
+        if line_number is not None:
+            message = f"line {line_number}: {message}"
+        super().__init__(message)
+        self.line_number = line_number
+
+
+class SymbolTable(dict):
+    # Interns opcodes, registers and labels to dense integer codes. A miss
+    # assigns the next code, so encoding is a single dict lookup.
+    def __init__(self):
+        super().__init__({None: InstructionTable.NONE})
+        self.names = []
+
+    def __missing__(self, symbol):
+        code = self[symbol] = len(self.names)
+        self.names.append(sys.intern(symbol))
+        return code
+
+
+class InstructionTable:
+    # Pre-decoded program. Every instruction is a row of small integers in
+    # parallel arrays: the opcode and its three raw operands as symbol codes
+    # plus the execution clock count. Branches keep their target label in
+    # the third operand. `Instruction`s are only materialized on fetch.
+    #
+    # `link` resolves every branch label once into `targets`, the row index
+    # it jumps to, so taking a branch never searches the program.
+    __slots__ = (
+        "symbols",
+        "ops",
+        "operands1",
+        "operands2",
+        "operands3",
+        "execution_clocks",
+        "labels",
+        "label_index",
+        "targets",
+        "first",
+    )
+
+    NONE = -1
+
+    def __init__(self):
+        self.symbols = SymbolTable()
+        self.ops = array("i")
+        self.operands1 = array("i")
+        self.operands2 = array("i")
+        self.operands3 = array("i")
+        self.execution_clocks = array("i")
+        self.labels = {}  # row index -> label, labels are sparse
+        self.label_index = {}  # label -> row index
+        self.targets = array("i")  # row index -> branch target row, or NONE
+        # row index of the first row the columns hold, only moved by a
+        # compiler that writes rows out as it goes, see tracefile.Compiler
+        self.first = 0
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __getitem__(self, index):
+        return self.fetch(index)
+
+    def __iter__(self):
+        for index in range(len(self.ops)):
+            yield self.fetch(index)
+
+    @classmethod
+    def from_trace(cls, trace):
+        # A linked table over the columns of a tracefile.Trace, without
+        # copying them. They belong to the trace, and may be read-only
+        # views of the trace cache, so the first append copies them, see
+        # `thaw`.
+        table = cls()
+        symbols = table.symbols
+        symbols.names = list(trace.symbols)
+        symbols.update(zip(symbols.names, range(len(symbols.names))))
+        table.ops = trace.ops
+        table.operands1 = trace.dests
+        table.operands2 = trace.sources1
+        table.operands3 = trace.sources2
+        table.execution_clocks = trace.latencies
+        table.targets = trace.targets
+        table.labels = trace.label_map()
+        table.label_index = trace.label_index()
+        return table
+
+    def __getstate__(self):
+        # mapped columns and trace labels are copied out, they do not pickle
+        state = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, memoryview):
+                value = array("i", value)
+            elif name == "labels" and not isinstance(value, dict):
+                value = dict(value.items())
+            elif name == "label_index" and not isinstance(value, dict):
+                value = dict(value.mapping())
+            state[name] = value
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def symbol(self, code):
+        return None if code == self.NONE else self.symbols.names[code]
+
+    def thaw(self):
+        # copies the columns and labels taken from a trace into arrays and a
+        # dict of this table's own, which can grow
+        names = ("ops", "operands1", "operands2", "operands3", "execution_clocks", "targets")
+        for name in names:
+            setattr(self, name, array("i", getattr(self, name).tobytes()))
+        self.labels = dict(self.labels.items())
+        self.label_index = {label: row for row, label in self.labels.items()}
+
+    def append(self, name, operand1, operand2, operand3, label=None, exe_clock=1):
+        self.extend([(None, label, name, operand1, operand2, operand3, exe_clock)])
+
+    def extend(self, rows):
+        # Appends (line number, label, op, operand1, operand2, operand3,
+        # clocks) rows, as Assembler.parse yields them. Every row of every
+        # table is written here, through bound appends, as the per-row
+        # lookups were most of the time a large program took to load.
+        if not isinstance(self.labels, dict):
+            self.thaw()
+        symbols = self.symbols
+        labels = self.labels
+        label_index = self.label_index
+        ops = self.ops.append
+        operands1 = self.operands1.append
+        operands2 = self.operands2.append
+        operands3 = self.operands3.append
+        execution_clocks = self.execution_clocks.append
+        row = self.first + len(self.ops)
+        for line_number, label, name, operand1, operand2, operand3, clock in rows:
+            if label is not None:
+                if label in label_index:
+                    raise AssemblerError(f"duplicate label {label}", line_number)
+                label = sys.intern(label)
+                labels[row] = label
+                label_index[label] = row
+            ops(symbols[name])
+            operands1(symbols[operand1])
+            operands2(symbols[operand2])
+            operands3(symbols[operand3])
+            execution_clocks(clock)
+            row += 1
+
+    def linked(self):
+        return len(self.targets) == len(self.ops)
+
+    def link(self):
+        if self.linked():
+            return
+        # only branch rows need a lookup, the rest stay NONE
+        branches = {code for name, code in self.symbols.items() if name in BRANCH_INSTS}
+        label_index = self.label_index
+        targets = array("i", [self.NONE]) * len(self.ops)
+        for index, op in enumerate(self.ops):
+            if op not in branches:
+                continue
+            label = self.symbol(self.operands3[index])
+            target = label_index.get(label)
+            if target is None:
+                raise AssemblerError(
+                    f"undefined label {label} in {self.fetch(index)!r} at index {index}"
+                )
+            targets[index] = target
+        self.targets = targets
+
+    def straighten(self, pcs):
+        # The rows at `pcs`, in that order, as a linked table of their own.
+        # A branch targets the row after it, so whether it is taken or not
+        # fetch continues down the path the pcs were recorded on.
+        self.link()
+        table = InstructionTable()
+        table.symbols = self.symbols
+        for name in ("ops", "operands1", "operands2", "operands3", "execution_clocks"):
+            column = getattr(self, name)
+            getattr(table, name).extend(column[pc] for pc in pcs)
+        targets = self.targets
+        table.targets.extend(
+            self.NONE if targets[pc] == self.NONE else row + 1
+            for row, pc in enumerate(pcs)
+        )
+        return table
+
+    def target(self, index):
+        target = self.targets[index]
+        return None if target == self.NONE else target
+
+    def fetch(self, index):
+        symbol = self.symbol
+        name = self.symbols.names[self.ops[index]]
+        operand1 = symbol(self.operands1[index])
+        operand2 = symbol(self.operands2[index])
+        operand3 = symbol(self.operands3[index])
+        label = self.labels.get(index)
+        exe_clock = self.execution_clocks[index]
+        if name in BRANCH_INSTS:
+            target = self.target(index) if self.linked() else None
+            return Instruction.decoded(
+                name, None, operand1, operand2, operand3, label, exe_clock,
+                pc=index, target=target,
+            )
+        return Instruction.decoded(
+            name, operand1, operand2, operand3, None, label, exe_clock, pc=index
+        )
+
+
+class Assembler:
+    # Assembly syntax, one instruction per line:
+    #
+    #   .clock MUL 3              ; default execution clocks for an opcode
+    #   LOOP: ADD R1 R2 R3        ; optional label
+    #         MUL R4 R1 R5 2      ; optional trailing per-instruction clocks
+    #         BNE R1 R0 LOOP      # both ';' and '#' start a comment
+    #         ST _ R3 1           ; "_" marks an unused operand
+    #
+    # A label on a line of its own is attached to the next instruction and
+    # operands after the last one used may be left out. This is the format
+    # all three engines read, see tracefile.
+    def __init__(self, clocks=None):
+        self.clocks = {**CLOCKS, **(clocks or {})}
+
+    def assemble(self, lines, table=None):
+        table = InstructionTable() if table is None else table
+        table.extend(self.parse(lines))
+        table.link()
+        return table
+
+    def parse(self, lines):
+        # (line number, label, op, operand1, operand2, operand3, clocks) of
+        # every instruction in `lines`
+        clocks = self.clocks
+        split_line = self.split_line
+        pending_label = None
+        for line_number, line in enumerate(lines, 1):
+            if ";" in line or "#" in line or ":" in line:
+                label, fields = split_line(line, line_number)
+            else:
+                label, fields = None, line.split()
+            if label is not None:
+                if pending_label is not None:
+                    raise AssemblerError(
+                        f"label {pending_label} has no instruction", line_number
+                    )
+                pending_label = label
+            if not fields:
+                continue
+            if fields[0] == ".clock":
+                if label is not None:
+                    raise AssemblerError("label on a directive", line_number)
+                self.directive_clock(fields, line_number)
+                continue
+            if len(fields) == 4 and "_" not in fields:
+                name, operand1, operand2, operand3 = fields
+                clock = clocks.get(name, 1)
+            else:
+                name, operand1, operand2, operand3, clock = self.instruction(fields, line_number)
+                if clock is None:
+                    clock = clocks.get(name, 1)
+            yield line_number, pending_label, name, operand1, operand2, operand3, clock
+            pending_label = None
+        if pending_label is not None:
+            raise AssemblerError(f"label {pending_label} has no instruction")
+
+    def assemble_file(self, path, table=None):
+        with open(path) as source:
+            return self.assemble(source, table)
+
+    def split_line(self, line, line_number=None):
+        for marker in (";", "#"):
+            cut = line.find(marker)
+            if cut != -1:
+                line = line[:cut]
+        label = None
+        if ":" in line:
+            label, line = line.split(":", 1)
+            label = label.strip()
+            if not label or " " in label:
+                raise AssemblerError(f"invalid label {label!r}", line_number)
+        return label, line.split()
+
+    def directive_clock(self, fields, line_number):
+        if len(fields) != 3:
+            raise AssemblerError(".clock expects an opcode and a clock count", line_number)
+        self.clocks[fields[1]] = self.parse_clock(fields[2], line_number)
+
+    def parse_clock(self, text, line_number):
+        try:
+            clock = int(text)
+        except ValueError:
+            raise AssemblerError(f"invalid clock count {text!r}", line_number) from None
+        if clock < 1:
+            raise AssemblerError(f"clock count must be positive, got {clock}", line_number)
+        return clock
+
+    def assemble_instruction(self, table, command, exe_clock=None):
+        label, fields = self.split_line(command)
+        name, operand1, operand2, operand3, clock = self.instruction(fields, None)
+        if clock is None:
+            clock = self.clocks.get(name, 1) if exe_clock is None else exe_clock
+        table.append(name, operand1, operand2, operand3, label, clock)
+
+    def instruction(self, fields, line_number):
+        # op, operands and trailing clocks, None without them, of the
+        # fields of an instruction line; "_" marks an unused operand
+        if len(fields) == 5:
+            clock = self.parse_clock(fields[4], line_number)
+        elif 0 < len(fields) < 5:
+            clock = None
+        else:
+            raise AssemblerError(
+                f"expected 'OP [A [B [C]]] [clocks]', got {' '.join(fields)!r}", line_number
+            )
+        operands = [None if field == "_" else field for field in fields[1:4]]
+        operands += [None] * (3 - len(operands))
+        return (fields[0], *operands, clock)
+
+
+def assemble(lines, clocks=None):
+    return Assembler(clocks).assemble(lines)
+
+
+def load(path, clocks=None):
+    return Assembler(clocks).assemble_file(path)
@@ -0,0 +1,75 @@
+import argparse
+import random
+
+import predictor
+from pipeline import Pipeline
+
+
+def loop_program(outer, inner, body, seed=0):
+    # Two nested counted loops. The inner one also holds a branch that is
+    # taken every other iteration, which only a predictor with history gets
+    # right.
+    rng = random.Random(seed)
+    lines = [
+        "ADD R8 R0 1",
+        f"ADD R1 R0 {outer}",
+        f"OUTER: ADD R2 R0 {inner}",
+        "INNER: SUB R7 R8 R7",
+        "BEQ R7 R0 SKIP",
+        "ADD R3 R3 R2",
+    ]
+    for i in range(body):
+        op = rng.choice(["ADD", "ADD", "SUB", "MUL"])
+        dest, src1, src2 = (f"R{rng.randrange(10, 20)}" for _ in range(3))
+        lines.append(f"{'SKIP: ' if i == 0 else ''}{op} {dest} {src1} {src2}")
+    if not body:
+        lines.append("SKIP: ADD R9 R9 R8")
+    lines += [
+        "SUB R2 R2 1",
+        "BNE R2 R0 INNER",
+        "SUB R1 R1 1",
+        "BNE R1 R0 OUTER",
+    ]
+    return lines
+
+
+def measure(lines, name, history, forwarding):
+    p = Pipeline(predictor=predictor.create(name, history=history))
+    p.hazard.forwarding = forwarding
+    p.assembler.assemble(lines, p.instructions)
+    p.run()
+    branches, mispredicts, flushed = p.branch_stats.totals()
+    return {
+        "cycles": p.clock,
+        "instructions": p.oracle.executed,
+        "branches": branches,
+        "mispredicts": mispredicts,
+        "flushed": flushed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPI of each branch predictor on loops.")
+    parser.add_argument("--outer", type=int, default=50)
+    parser.add_argument("--inner", type=int, default=40)
+    parser.add_argument("--body", type=int, default=4, help="instructions in the inner loop")
+    parser.add_argument("--history", type=int, default=8, help="gshare history bits")
+    parser.add_argument("--forwarding", action="store_true")
+    args = parser.parse_args()
+    lines = loop_program(args.outer, args.inner, args.body)
+
+    print(
+        f"{'Predictor':<12}{'Cycles':>9}{'CPI':>8}{'Branches':>10}"
+        f"{'Mispred':>9}{'Accuracy':>10}{'Flushed':>9}"
+    )
+    for name in predictor.PREDICTORS:
+        r = measure(lines, name, args.history, args.forwarding)
+        accuracy = 1 - r["mispredicts"] / r["branches"] if r["branches"] else 1.0
+        print(
+            f"{name:<12}{r['cycles']:>9}{r['cycles'] / r['instructions']:>8.3f}"
+            f"{r['branches']:>10}{r['mispredicts']:>9}{accuracy:>10.1%}{r['flushed']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
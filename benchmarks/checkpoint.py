@@ -0,0 +1,73 @@
+import argparse
+import os
+import tempfile
+import time
+
+import checkpoint
+from benchmarks.workload import generate
+from sweep import BUILDERS, ENGINES
+
+
+def full_run(job):
+    engine, size = job
+    simulator, _ = BUILDERS[engine](generate(engine, size), {})
+    simulator.run()
+    return simulator.counters()
+
+
+def measure(job):
+    # simulates a prefix, checkpoints it, then restores the checkpoint and
+    # runs to the end
+    engine, size, prefix, path = job
+    simulator, _ = BUILDERS[engine](generate(engine, size), {})
+    start = time.perf_counter()
+    simulator.run(until=prefix)
+    simulate_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    size_bytes = checkpoint.save(simulator, path)
+    save_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    restored = checkpoint.load(path)
+    restore_seconds = time.perf_counter() - start
+    restored.run()
+    return {
+        "engine": engine,
+        "prefix": prefix,
+        "simulate_seconds": simulate_seconds,
+        "save_seconds": save_seconds,
+        "restore_seconds": restore_seconds,
+        "bytes": size_bytes,
+        "counters": restored.counters(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpoint restore vs re-simulation.")
+    parser.add_argument("--engine", action="append", choices=ENGINES)
+    parser.add_argument("--size", type=int, default=10**4)
+    parser.add_argument(
+        "--fraction", type=float, default=0.9, help="share of the run in the prefix"
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'Engine':<12}{'Prefix':>9}{'Simulate':>11}{'Save':>9}{'Restore':>10}"
+        f"{'Speedup':>10}{'KiB':>8}  Resumed run matches"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in args.engine or ENGINES:
+            path = os.path.join(tmp, f"{engine}.ckpt")
+            total = full_run((engine, args.size))
+            prefix = max(1, int(total["cycles"] * args.fraction))
+            r = measure((engine, args.size, prefix, path))
+            print(
+                f"{engine:<12}{r['prefix']:>9}{r['simulate_seconds']:>10.3f}s"
+                f"{r['save_seconds']:>8.3f}s{r['restore_seconds']:>9.3f}s"
+                f"{r['simulate_seconds'] / r['restore_seconds']:>9.0f}x"
+                f"{r['bytes'] / 1024:>8.1f}  {r['counters'] == total}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import timeit
+
+from instruction import Instruction
+from pipeline import Pipeline
+
+
+def occupied_pipeline(occupancy):
+    # EX holds `occupancy` long-latency writers, ID and WB hold instructions
+    # that conflict with none of them, so every check runs to completion.
+    p = Pipeline()
+    for k in range(occupancy):
+        inst = Instruction.decoded("MUL", f"R{k + 16}", "R1", "R2", exe_clock=10**9)
+        inst.stage = "EX"
+        p.pipeline[2].append(inst)
+        p.hazard.track_front(inst, 1)
+        p.hazard.track_back(inst, 1)
+    reader = Instruction.decoded("ADD", "R3", "R4", "R5")
+    reader.stage = "ID"
+    p.pipeline[1] = reader
+    p.hazard.track_front(reader, 1)
+    done = Instruction.decoded("SUB", "R6", "R7", "R8")
+    done.stage = "WB"
+    done.order = 10**9
+    p.pipeline[4].append(done)
+    p.hazard.track_back(done, 1)
+    return p
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hazard check cost vs EX occupancy.")
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'EX occupancy':<16}{'RAW ns':<12}{'WAR ns':<12}{'WAW ns':<12}")
+    for occupancy in (1, 10, 100, 1000, 10000):
+        hazard = occupied_pipeline(occupancy).hazard
+        row = []
+        for check in (hazard.raw_hazards, hazard.war_hazards, hazard.waw_hazards):
+            seconds = min(timeit.repeat(check, number=args.repeat, repeat=3))
+            row.append(seconds / args.repeat * 1e9)
+        print(f"{occupancy:<16}" + "".join(f"{ns:<12.0f}" for ns in row))
+
+
+if __name__ == "__main__":
+    main()
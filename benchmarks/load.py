@@ -0,0 +1,64 @@
+import argparse
+import random
+import time
+import tracemalloc
+
+from assembler import Assembler
+from instruction import Instruction
+
+OPS = ["ADD", "SUB", "MUL"]
+BRANCHES = ["BEQ", "BNE"]
+
+
+def synthetic_source(count, seed=0):
+    rng = random.Random(seed)
+    lines = [".clock MUL 2"]
+    for i in range(count):
+        label = f"L{i}: " if i % 16 == 0 else ""
+        r = [f"R{rng.randrange(32)}" for _ in range(3)]
+        if i % 16 == 15:
+            lines.append(f"{label}{rng.choice(BRANCHES)} {r[0]} {r[1]} L{i - 15}")
+        else:
+            lines.append(f"{label}{rng.choice(OPS)} {r[0]} {r[1]} {r[2]}")
+    return lines
+
+
+def load_objects(lines):
+    # the pre-assembler load path: one parsed Instruction per line
+    return [Instruction(line) for line in lines[1:]]
+
+
+def load_table(lines):
+    return Assembler().assemble(lines)
+
+
+def measure(loader, lines):
+    start = time.perf_counter()
+    program = loader(lines)
+    elapsed = time.perf_counter() - start
+    del program
+    # tracing slows allocation down, so memory is measured on a second pass
+    tracemalloc.start()
+    program = loader(lines)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return program, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare program load paths.")
+    parser.add_argument("-n", "--count", type=int, default=10**6)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    lines = synthetic_source(args.count, args.seed)
+    print(f"{'Loader':<18}{'Seconds':<12}{'Peak MiB':<12}{'Inst/s'}")
+    for name, loader in (("Instruction", load_objects), ("Assembler", load_table)):
+        program, elapsed, peak = measure(loader, lines)
+        print(
+            f"{name:<18}{elapsed:<12.3f}{peak / 2**20:<12.1f}{len(program) / elapsed:,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import time
+
+from benchmarks.workload import generate
+from sweep import BUILDERS, ENGINES
+
+SIZES = [10**3, 10**4, 10**5, 10**6]
+
+
+def measure(job):
+    # runs in a fresh process so peak RSS belongs to this measurement alone
+    engine, size, knobs = job
+    lines = generate(engine, size, **knobs)
+    start = time.perf_counter()
+    simulator, _ = BUILDERS[engine](lines, {})
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    simulator.run()
+    run_seconds = time.perf_counter() - start
+    cycles = simulator.counters()["cycles"]
+    return {
+        "engine": engine,
+        "instructions": size,
+        "cycles": cycles,
+        "load_seconds": load_seconds,
+        "run_seconds": run_seconds,
+        "cycles_per_second": cycles / run_seconds,
+        "instructions_per_second": size / run_seconds,
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(engines, sizes, knobs, budget):
+    results = []
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        for engine in engines:
+            for size in sizes:
+                result = pool.apply(measure, ((engine, size, knobs),))
+                results.append(result)
+                print(
+                    f"{engine:<12}{size:>9}{result['cycles']:>11}"
+                    f"{result['run_seconds']:>10.2f}s"
+                    f"{result['cycles_per_second']:>14,.0f}"
+                    f"{result['instructions_per_second']:>14,.0f}"
+                    f"{result['peak_rss_kib'] / 1024:>10.1f}",
+                    flush=True,
+                )
+                # larger programs of a slow engine would only burn time
+                if result["run_seconds"] > budget:
+                    break
+    return results
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path) as baseline_file:
+        baseline = {
+            (r["engine"], r["instructions"]): r for r in json.load(baseline_file)["results"]
+        }
+    print(f"\n{'Engine':<12}{'Insts':>9}{'Speedup':>10}")
+    regressions = 0
+    for result in results:
+        base = baseline.get((result["engine"], result["instructions"]))
+        if base is None:
+            continue
+        speedup = result["cycles_per_second"] / base["cycles_per_second"]
+        flag = "  REGRESSION" if speedup < 1 - threshold else ""
+        regressions += bool(flag)
+        print(f"{result['engine']:<12}{result['instructions']:>9}{speedup:>9.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure simulator speed.")
+    parser.add_argument("--engine", action="append", choices=ENGINES)
+    parser.add_argument("--size", action="append", type=int)
+    parser.add_argument("--dependency-distance", type=float, default=4)
+    parser.add_argument("--branch-density", type=float, default=0.05)
+    parser.add_argument(
+        "--mix", default="alu=6,mul=1,mem=3", help="op class weights, e.g. alu=6,mul=1,mem=3"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=60,
+        help="skip larger sizes of an engine once a run takes longer (seconds)",
+    )
+    parser.add_argument("-o", "--output", default="bench_output.json")
+    parser.add_argument("--baseline", help="earlier output file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="slowdown reported as a regression"
+    )
+    args = parser.parse_args()
+
+    mix = {}
+    for part in args.mix.split(","):
+        name, _, weight = part.partition("=")
+        mix[name] = float(weight)
+    knobs = {
+        "dependency_distance": args.dependency_distance,
+        "branch_density": args.branch_density,
+        "mix": mix,
+        "seed": args.seed,
+    }
+    print(
+        f"{'Engine':<12}{'Insts':>9}{'Cycles':>11}{'Run':>11}"
+        f"{'Cycles/s':>14}{'Insts/s':>14}{'Peak MiB':>10}"
+    )
+    results = run(args.engine or ENGINES, args.size or SIZES, knobs, args.budget)
+    with open(args.output, "w") as output:
+        json.dump(
+            {
+                "revision": revision(),
+                "python": platform.python_version(),
+                "workload": knobs,
+                "results": results,
+            },
+            output,
+            indent=2,
+        )
+    if args.baseline:
+        compare(results, args.baseline, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from pipeline import Pipeline
+
+
+def program(length, seed=0):
+    # generated line by line, never held as a whole
+    rng = random.Random(seed)
+    for _ in range(length):
+        op = rng.choice(["ADD", "ADD", "SUB", "MUL"])
+        dest, src1, src2 = (f"R{rng.randrange(32)}" for _ in range(3))
+        yield f"{op} {dest} {src1} {src2}"
+
+
+def measure(length, path, window):
+    # peak Python memory of the run; with a window the program is streamed
+    # to a mapped trace, without one it is assembled in memory
+    tracemalloc.start()
+    start = time.perf_counter()
+    p = Pipeline(window=window)
+    if window is None:
+        p.assembler.assemble(program(length), p.instructions)
+    else:
+        p.stream(program(length), path)
+    p.run()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return p.counters(), peak, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of in-memory vs streamed pipeline runs.")
+    parser.add_argument("--size", type=int, action="append")
+    parser.add_argument("--window", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'Rows':>9}{'Memory KiB':>12}{'Streamed KiB':>14}{'Time':>9}{'Streamed':>10}  Same")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stream.trace")
+        for size in args.size or [10**4, 10**5]:
+            counters, peak, seconds = measure(size, path, None)
+            streamed, streamed_peak, streamed_seconds = measure(size, path, args.window)
+            print(
+                f"{size:>9}{peak / 1024:>12.0f}{streamed_peak / 1024:>14.0f}"
+                f"{seconds:>8.2f}s{streamed_seconds:>9.2f}s  {counters == streamed}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import gc
+import os
+import tempfile
+import time
+
+import tracefile
+from benchmarks.workload import generate
+from sweep import BUILDERS, ENGINES
+
+
+def timed(function, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def read_text(path, engine):
+    with open(path) as source:
+        simulator, _ = BUILDERS[engine](tuple(source), {})
+    return simulator
+
+
+def read_compiled(path, engine, cache):
+    simulator, _ = BUILDERS[engine](tracefile.load(path, cache), {})
+    return simulator
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Startup of a simulator from the text trace and from the compiled cache."
+    )
+    parser.add_argument("--engine", action="append", choices=ENGINES)
+    parser.add_argument("--size", type=int, default=10**5)
+    args = parser.parse_args()
+
+    print(f"{'Engine':<12}{'Rows':>9}{'Text':>9}{'Compile':>10}{'Cached':>9}{'Speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = os.path.join(tmp, "cache")
+        for engine in args.engine or ENGINES:
+            path = os.path.join(tmp, f"{engine}.trace")
+            with open(path, "w") as output:
+                output.writelines(f"{line}\n" for line in generate(engine, args.size))
+            text, text_seconds = timed(read_text, path, engine)
+            text.run()
+            counters = text.counters()
+            del text
+            _, compile_seconds = timed(read_compiled, path, engine, cache)
+            cached, cached_seconds = timed(read_compiled, path, engine, cache)
+            cached.run()
+            assert cached.counters() == counters, engine
+            print(
+                f"{engine:<12}{args.size:>9}{text_seconds:>8.3f}s{compile_seconds:>9.3f}s"
+                f"{cached_seconds:>8.3f}s{text_seconds / cached_seconds:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
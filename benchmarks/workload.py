@@ -0,0 +1,105 @@
+import random
+
+# Synthetic programs for the three engines. Every generator takes the same
+# knobs:
+#
+#   length               number of instructions
+#   dependency_distance  mean distance back to the producer of a source
+#                        operand, 0 for independent instructions
+#   branch_density       fraction of branches (engines with branches only)
+#   mix                  relative weight of each op class
+#   seed                 programs are fully determined by the seed
+#
+# and returns the program as source lines in that engine's input format.
+
+MIX = {"alu": 6, "mul": 1, "mem": 3}
+
+OPS = {
+    "pipeline": {"alu": ["ADD", "SUB"], "mul": ["MUL"], "mem": ["ADD"]},
+    "scoreboard": {
+        "alu": ["ADD", "SUB", "AND", "OR", "XOR"],
+        "mul": ["SHL", "SHR"],
+        "mem": ["LD", "ST"],
+    },
+    "tomasulo": {
+        "alu": ["ADD", "SUB", "AND", "OR", "XOR"],
+        "mul": ["MUL"],
+        "mem": ["LD", "ST"],
+    },
+}
+
+REGISTERS = {"pipeline": 32, "scoreboard": 8, "tomasulo": 32}
+
+
+class Workload:
+    def __init__(
+        self, engine, length, dependency_distance=4, branch_density=0.0, mix=None, seed=0
+    ):
+        self.engine = engine
+        self.length = length
+        self.dependency_distance = dependency_distance
+        self.branch_density = branch_density
+        self.mix = dict(MIX if mix is None else mix)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.destinations = []
+        classes = [c for c in self.mix if self.mix[c] > 0]
+        self.classes = classes
+        self.weights = [self.mix[c] for c in classes]
+
+    def register(self):
+        return f"R{self.rng.randrange(REGISTERS[self.engine])}"
+
+    def source(self):
+        # pick the destination of an instruction about `dependency_distance`
+        # back, or an arbitrary register for independent operands
+        if self.dependency_distance <= 0 or not self.destinations:
+            return self.register()
+        distance = 1 + int(self.rng.expovariate(1 / self.dependency_distance))
+        if distance > len(self.destinations):
+            return self.register()
+        return self.destinations[-distance]
+
+    def op(self):
+        op_class = self.rng.choices(self.classes, self.weights)[0]
+        return self.rng.choice(OPS[self.engine][op_class])
+
+    def lines(self):
+        generate = getattr(self, self.engine)
+        return [generate(i) for i in range(self.length)]
+
+    def pipeline(self, i):
+        # branches only jump forward, the pipeline always takes them
+        label = f"L{i}: "
+        if self.rng.random() < self.branch_density and i + 2 < self.length:
+            target = self.rng.randrange(i + 2, min(self.length, i + 8))
+            return f"{label}BNE {self.source()} {self.source()} L{target}"
+        dest = self.register()
+        line = f"{label}{self.op()} {dest} {self.source()} {self.source()}"
+        self.destinations.append(dest)
+        return line
+
+    def scoreboard(self, i):
+        if self.rng.random() < self.branch_density:
+            return f"{self.rng.choice(['BRZ', 'BRNZ'])} _ {i}"
+        return self.memory_or_alu(i)
+
+    def tomasulo(self, i):
+        return self.memory_or_alu(i)
+
+    def memory_or_alu(self, i):
+        op = self.op()
+        if op == "LD":
+            dest = self.register()
+            self.destinations.append(dest)
+            return f"LD {dest} {self.rng.randrange(256)}"
+        if op == "ST":
+            return f"ST _ {self.source()} {self.rng.randrange(256)}"
+        dest = self.register()
+        line = f"{op} {dest} {self.source()} {self.source()}"
+        self.destinations.append(dest)
+        return line
+
+
+def generate(engine, length, **knobs):
+    return Workload(engine, length, **knobs).lines()
@@ -0,0 +1,46 @@
+import pickle
+import zlib
+
+# A checkpoint is the pickled simulator, compressed, behind a short header:
+#
+#   MAGIC | format version (1 byte) | zlib(pickle(simulator))
+#
+# Pickling keeps the object graph intact, so instructions shared between
+# stages, heaps and register tables are still shared after a restore.
+# Simulators drop their tracer when pickled and come back with a
+# NullTracer, pass `tracer` to `load` to attach another one.
+MAGIC = b"SIMCKPT"
+VERSION = 1
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def dumps(simulator, level=6):
+    payload = pickle.dumps(simulator, protocol=pickle.HIGHEST_PROTOCOL)
+    return MAGIC + bytes([VERSION]) + zlib.compress(payload, level)
+
+
+def loads(data, tracer=None):
+    if not data.startswith(MAGIC):
+        raise CheckpointError("not a simulator checkpoint")
+    version = data[len(MAGIC)]
+    if version != VERSION:
+        raise CheckpointError(f"unsupported checkpoint version {version}")
+    simulator = pickle.loads(zlib.decompress(data[len(MAGIC) + 1 :]))
+    if tracer is not None:
+        simulator.tracer = tracer
+    return simulator
+
+
+def save(simulator, path, level=6):
+    data = dumps(simulator, level)
+    with open(path, "wb") as checkpoint:
+        checkpoint.write(data)
+    return len(data)
+
+
+def load(path, tracer=None):
+    with open(path, "rb") as checkpoint:
+        return loads(checkpoint.read(), tracer)
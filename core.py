@@ -0,0 +1,179 @@
+from instruction import BRANCH_INSTS
+
+# The architectural model behind functional.py: registers, memory and
+# branch outcomes, no timing. It lives on its own so the pipeline can
+# build its branch oracle without importing the sweep machinery.
+
+WORD = 0xFFFFFFFF
+
+
+def signed(value):
+    return value - (1 << 32) if value & 0x80000000 else value
+
+
+def rotate_right(value):
+    return ((value >> 1) | (value << 31)) & WORD
+
+
+def rotate_left(value):
+    return ((value << 1) | (value >> 31)) & WORD
+
+
+BINARY = {
+    "ADD": lambda a, b: (a + b) & WORD,
+    "SUB": lambda a, b: (a - b) & WORD,
+    "MUL": lambda a, b: (a * b) & WORD,
+    "AND": lambda a, b: a & b,
+    "OR": lambda a, b: a | b,
+    "XOR": lambda a, b: a ^ b,
+}
+
+UNARY = {
+    "ROR": rotate_right,
+    "ROL": rotate_left,
+    "SHR": lambda a: a >> 1,
+    "SHL": lambda a: (a << 1) & WORD,
+    "NOT": lambda a: ~a & WORD,
+}
+
+BRANCH = {
+    "BEQ": lambda a, b: a == b,
+    "BNE": lambda a, b: a != b,
+    "BGTZ": lambda a, b: signed(a) > 0,
+    "BLTZ": lambda a, b: signed(a) < 0,
+    "BGEZ": lambda a, b: signed(a) >= 0,
+    "BLEZ": lambda a, b: signed(a) <= 0,
+}
+
+# no architectural effect in these models. The scoreboard and Tomasulo
+# models issue strictly in program order, so their BRZ/BRNZ only occupy a
+# unit and never redirect fetch; the core treats them the same way to
+# stay on the modelled path.
+NOP = {"BRZ", "BRNZ", "NO_OP"}
+
+
+
+def operand(text):
+    # registers stay names, numeric operands become immediates
+    if text is None or not text.isdigit():
+        return text
+    return int(text)
+
+
+class TableProgram:
+    # The rows of an InstructionTable as FunctionalCore program rows,
+    # decoded on access, so a core over a long mapped trace holds no
+    # per-instruction objects. Slower per step than a decoded program.
+    def __init__(self, table):
+        table.link()
+        self.table = table
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, pc):
+        table = self.table
+        symbol = table.symbol
+        name = table.symbols.names[table.ops[pc]]
+        target = table.target(pc)
+        if name in BRANCH_INSTS:
+            return (
+                name,
+                None,
+                operand(symbol(table.operands1[pc])),
+                operand(symbol(table.operands2[pc])),
+                target,
+            )
+        return (
+            name,
+            symbol(table.operands1[pc]),
+            operand(symbol(table.operands2[pc])),
+            operand(symbol(table.operands3[pc])),
+            target,
+        )
+
+
+class FunctionalCore:
+    def __init__(self, program, registers=None, memory=None, taken=None):
+        # program: (op, dest, src1, src2, target) rows, see from_table and
+        # from_instructions. `taken` True or False forces every branch that
+        # way, as the pipeline does without a predictor, None follows the
+        # real outcomes.
+        self.program = program
+        self.taken = taken
+        self.registers = dict(registers or {})
+        self.memory = dict(memory or {})
+        self.output = []
+        self.pc = 0
+        self.executed = 0
+        self.halted = False
+
+    @classmethod
+    def from_table(cls, table, lazy=False, **state):
+        if lazy:
+            return cls(TableProgram(table), **state)
+        table.link()
+        program = []
+        for index, inst in enumerate(table):
+            program.append(
+                (
+                    inst.name,
+                    inst.destination,
+                    operand(inst.source1),
+                    operand(inst.source2),
+                    table.target(index),
+                )
+            )
+        return cls(program, **state)
+
+    @classmethod
+    def from_instructions(cls, instructions, **state):
+        program = [
+            (inst.op, inst.dest, operand(inst.src1), operand(inst.src2), None)
+            for inst in instructions
+        ]
+        return cls(program, **state)
+
+    def value(self, source):
+        if source is None:
+            return 0
+        if source.__class__ is int:
+            return source
+        return self.registers.get(source, 0)
+
+    def run(self, count=None, trace=None):
+        # Executes up to `count` instructions, appending each executed pc to
+        # `trace` when given. Returns the number of instructions executed.
+        program = self.program
+        registers = self.registers
+        value = self.value
+        end = len(program)
+        taken = self.taken
+        pc = self.pc
+        executed = 0
+        while pc < end and not self.halted and (count is None or executed < count):
+            op, dest, src1, src2, target = program[pc]
+            if trace is not None:
+                trace.append(pc)
+            executed += 1
+            pc += 1
+            if op in BINARY:
+                registers[dest] = BINARY[op](value(src1), value(src2))
+            elif op in BRANCH:
+                if BRANCH[op](value(src1), value(src2)) if taken is None else taken:
+                    pc = target
+            elif op in UNARY:
+                registers[dest] = UNARY[op](value(dest))
+            elif op == "LD":
+                registers[dest] = self.memory.get(value(src1), 0)
+            elif op == "ST":
+                self.memory[value(src2)] = value(src1)
+            elif op == "OUT":
+                self.output.append(value(dest))
+            elif op == "HLT":
+                self.halted = True
+            elif op not in NOP:
+                raise ValueError(f"no functional model for {op} at {pc - 1}")
+        self.pc = pc
+        self.executed += executed
+        return executed
@@ -0,0 +1,168 @@
+import argparse
+import math
+import multiprocessing
+import statistics
+import time
+from array import array
+
+import tracefile
+from core import FunctionalCore
+from scoreboard import main as scoreboard
+from sweep import BUILDERS, ENGINES, read_trace
+from tomasulo import main as tomasulo
+
+# Functional execution: registers, memory and branch outcomes, no timing.
+# It runs the same programs as the cycle models, orders of magnitude
+# faster, to skip to a region of interest or to pick sample windows.
+
+INSTRUCTIONS = {"scoreboard": scoreboard.Instruction, "tomasulo": tomasulo.Instruction}
+
+
+def core_for(engine, lines, params=None):
+    # a core on the path the detailed model fetches: without a predictor
+    # the pipeline takes every branch, or none with branch_inst off
+    if engine == "pipeline":
+        simulator, _ = BUILDERS[engine](lines, params or {})
+        taken = simulator.branch_inst if simulator.predictor is None else None
+        return FunctionalCore.from_table(simulator.instructions, taken=taken)
+    return FunctionalCore.from_instructions(tracefile.read_program(lines, INSTRUCTIONS[engine]))
+
+
+def fast_forward(engine, lines, count, params=None):
+    # Executes the first `count` instructions functionally and returns a
+    # detailed simulator that starts where the functional core stopped,
+    # together with the core holding registers and memory at that point.
+    params = params or {}
+    if engine != "pipeline":
+        lines = tracefile.parse(lines)
+    core = core_for(engine, lines, params)
+    core.run(count)
+    if engine == "pipeline":
+        simulator, _ = BUILDERS[engine](lines, params)
+        simulator.instruction_pointer = core.pc
+        if simulator.predictor is not None:
+            # branch outcomes continue from the fast-forwarded state
+            simulator.oracle = FunctionalCore(core.program, core.registers, core.memory)
+            simulator.oracle.pc = core.pc
+    else:
+        simulator, _ = BUILDERS[engine](tracefile.program_lines(lines)[core.pc :], params)
+    return simulator, core
+
+
+def window_cycles(job):
+    # program: a straight-line InstructionTable for the pipeline, source
+    # lines otherwise
+    engine, program, params = job
+    if engine == "pipeline":
+        simulator, _ = BUILDERS[engine]([], params)
+        simulator.instructions = program
+    else:
+        simulator, _ = BUILDERS[engine](program, params)
+    simulator.run()
+    return simulator.counters()["cycles"]
+
+
+def sample(
+    engine, lines, windows=10, window=1000, warmup=200, params=None, z=1.96, workers=None
+):
+    # Runs `windows` detailed windows spread evenly over the dynamic
+    # instruction stream and extrapolates the total cycle count from their
+    # mean CPI. Each window is simulated with and without its `window`
+    # measured instructions after `warmup` instructions, so the fill of an
+    # empty machine is charged to the warm-up and not to the sample.
+    params = params or {}
+    if engine != "pipeline":
+        lines = tracefile.parse(lines)
+    core = core_for(engine, lines, params)
+    pcs = array("i")
+    core.run(trace=pcs)
+    total = len(pcs)
+    span = warmup + window
+    if total <= span or windows < 2:
+        raise ValueError(f"{total} instructions is too short for {windows} windows of {span}")
+    stride = (total - span) / (windows - 1)
+
+    if engine == "pipeline":
+        simulator, _ = BUILDERS[engine](lines, {})
+        table = simulator.instructions
+        program = lambda start, end: table.straighten(pcs[start:end])
+    else:
+        code = tracefile.program_lines(lines)
+        program = lambda start, end: [code[pc] for pc in pcs[start:end]]
+
+    jobs = []
+    for i in range(windows):
+        start = int(i * stride)
+        jobs.append((engine, program(start, start + span), params))
+        if warmup:
+            jobs.append((engine, program(start, start + warmup), params))
+    with multiprocessing.Pool(workers) as pool:
+        cycles = pool.map(window_cycles, jobs, chunksize=1)
+    if warmup:
+        cycles = [full - warm for full, warm in zip(cycles[::2], cycles[1::2])]
+    cpis = [c / window for c in cycles]
+
+    cpi = statistics.fmean(cpis)
+    error = z * statistics.stdev(cpis) / math.sqrt(windows)
+    return {
+        "instructions": total,
+        "cpi": cpi,
+        "cycles": cpi * total,
+        "bound": error * total,
+        "windows": cpis,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Functional fast-forward and sampling.")
+    parser.add_argument("engine", choices=ENGINES)
+    parser.add_argument("trace", help="program to simulate")
+    parser.add_argument(
+        "--skip", type=int, help="execute this many instructions functionally, then simulate"
+    )
+    parser.add_argument("--detail", type=int, help="simulate at most this many cycles")
+    parser.add_argument("--windows", type=int, help="sampled simulation with this many windows")
+    parser.add_argument("--window", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--verify", action="store_true", help="also simulate in full")
+    args = parser.parse_args()
+    lines = read_trace(args.trace)
+
+    start = time.perf_counter()
+    if args.windows:
+        result = sample(
+            args.engine,
+            lines,
+            args.windows,
+            args.window,
+            args.warmup,
+            workers=args.workers,
+        )
+        print(
+            f"Instructions: {result['instructions']}\n"
+            f"CPI: {result['cpi']:.3f}\n"
+            f"Estimated cycles: {result['cycles']:.0f} +/- {result['bound']:.0f} (95%)"
+        )
+    else:
+        simulator, core = fast_forward(args.engine, lines, args.skip or 0)
+        skipped = time.perf_counter() - start
+        simulator.run(until=args.detail)
+        print(
+            f"Functional: {core.executed} instructions in {skipped:.3f}s\n"
+            f"Detailed: {simulator.counters()}"
+        )
+    print(f"Time: {time.perf_counter() - start:.3f}s")
+
+    if args.verify:
+        start = time.perf_counter()
+        simulator, _ = BUILDERS[args.engine](lines, {})
+        simulator.run()
+        print(
+            f"Full simulation: {simulator.counters()['cycles']} cycles "
+            f"in {time.perf_counter() - start:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
+from collections import Counter
+
+from instruction import BRANCH_INSTS, ISA
+
+
 class Hazard:
     def __init__(self, pipeline):
         self.pipeline = pipeline
@@ -5,6 +10,33 @@ class Hazard:
         self.stall = 0
         self.forward = 0
         self.flush = 0
+        # Register scoreboard, kept up to date by the pipeline as
+        # instructions enter and leave stages:
+        #   back_readers / back_writers: registers read / written by the
+        #     instructions in EX, MEM and WB, with multiplicity.
+        #   front_writers: registers written by the instructions in IF, ID,
+        #     EX and MEM, with multiplicity.
+        self.back_readers = Counter()
+        self.back_writers = Counter()
+        self.front_writers = Counter()
+        # opcode -> unit index, and whether each unit takes a new
+        # instruction while another one is still in EX
+        self.unit = ISA.unit
+        self.pipelined = [ISA.unit_config[u].get("pipelined", True) for u in ISA.units]
+
+    def track_front(self, inst, delta):
+        self.front_writers[inst.destination] += delta
+
+    def track_back(self, inst, delta):
+        self.back_readers[inst.source1] += delta
+        self.back_readers[inst.source2] += delta
+        self.back_writers[inst.destination] += delta
+
+    def flush_instruction(self, inst):
+        self.track_front(inst, -1)
+        inst.noop_instuction()
+        self.track_front(inst, 1)
+        self.flush += 1
 
     # should return a boolean indicates if hazard occurs, the pipeline
     # should move forward in a proper manner if hazard exists.
@@ -12,47 +44,104 @@ class Hazard:
         return False
 
     def control_hazards_with_branch(self):
-        branch_insts = ["BEQ", "BNE", "BGTZ", "BLTZ", "BGEZ", "BLEZ"]
         instructions = self.pipeline.pipeline[2]  # EX stage
         for instruction in instructions:
-            if instruction.name in branch_insts:
-                self.pipeline.instruction_pointer = next(
-                    (
-                        i
-                        for i, obj in enumerate(self.pipeline.instructions)
-                        if obj.label == instruction.branch
-                    ),
-                    None,
-                )
+            # targets are resolved when the program is linked
+            if instruction.name in BRANCH_INSTS:
+                self.pipeline.instruction_pointer = instruction.target
                 for j in range(0, 2):
-                    self.pipeline.pipeline[j].noop_instuction()
-                    self.flush += 1
+                    if self.pipeline.pipeline[j] is None:
+                        continue
+                    self.flush_instruction(self.pipeline.pipeline[j])
                 self.pipeline.move_instructions()
                 return True
         return False
 
+    def control_hazards_predicted(self):
+        # Branches resolve in EX against the outcome recorded at fetch. The
+        # predictor and BTB learn it, and a wrong guess flushes IF and ID,
+        # which only hold wrong-path instructions, and refetches.
+        pipeline = self.pipeline
+        for instruction in pipeline.pipeline[2]:
+            if instruction.outcome is None:
+                continue
+            outcome, instruction.outcome = instruction.outcome, None
+            pc = instruction.pc
+            taken = outcome != pc + 1
+            pipeline.predictor.update(pc, taken, instruction.history)
+            if taken:
+                pipeline.btb.update(pc, outcome)
+            if outcome == instruction.prediction:
+                pipeline.branch_stats.record(pc, False, 0)
+                continue
+            pipeline.instruction_pointer = outcome
+            pipeline.wrong_path = False
+            flushed = 0
+            for j in range(0, 2):
+                if pipeline.pipeline[j] is None:
+                    continue
+                self.flush_instruction(pipeline.pipeline[j])
+                flushed += 1
+            pipeline.branch_stats.record(pc, True, flushed)
+            pipeline.move_instructions()
+            return True
+        return False
+
     def control_hazards(self):
+        if self.pipeline.predictor is not None:
+            return self.control_hazards_predicted()
         if self.pipeline.branch_inst:
             return self.control_hazards_with_branch()
         else:
             return self.control_hazards_without_branch()
 
+    def structural_conflict(self):
+        # whether structural_hazards would stall an instruction this cycle,
+        # which only happens to a second instruction in EX on a unit that
+        # is not pipelined
+        unit, pipelined = self.unit, self.pipelined
+        held = set()
+        for inst in self.pipeline.pipeline[2]:
+            # an unknown mnemonic has no opcode and runs on no unit
+            if inst.opcode == ISA.NONE:
+                continue
+            u = unit[inst.opcode]
+            if u != ISA.NONE and not pipelined[u]:
+                if u in held:
+                    return True
+                held.add(u)
+        return False
+
+    def branch_in_execution(self):
+        if self.pipeline.predictor is not None:
+            return any(inst.outcome is not None for inst in self.pipeline.pipeline[2])
+        return self.pipeline.branch_inst and any(
+            inst.name in BRANCH_INSTS for inst in self.pipeline.pipeline[2]
+        )
+
     def structural_hazards(self):
-        FU_1 = ['MUL']
-        FU_2 = ['ADD', 'SUB']
-        fu1_busy_inst = None
-        fu2_busy_inst = None
+        # the first instruction in EX on a unit holds it, later ones on a
+        # unit that is not pipelined stall
+        unit, pipelined = self.unit, self.pipelined
+        held = set()
         stall_insts = []
-        for idx, inst in enumerate(self.pipeline.pipeline[2]):
-            if inst.name in FU_1 and fu1_busy_inst is None:
-                fu1_busy_inst  = inst
+        ex = self.pipeline.pipeline[2]
+        # walk a list copy so a stall skips its successor, as popping from
+        # the stage list always did
+        insts = list(ex)
+        for idx, inst in enumerate(insts):
+            if inst.opcode == ISA.NONE:
                 continue
-            if inst.name in FU_2 and fu2_busy_inst is None:
-                fu2_busy_inst  = inst
+            u = unit[inst.opcode]
+            if u == ISA.NONE:
                 continue
-            if inst.name not in FU_1+FU_1:
+            if u not in held:
+                held.add(u)
                 continue
-            instruction = self.pipeline.pipeline[2].pop(idx)
+            if pipelined[u]:
+                continue
+            instruction = insts.pop(idx)
+            ex.remove(instruction)
             instruction.order += 1
             stall_insts.append(instruction)
         if len(stall_insts) == 0:
@@ -60,7 +149,7 @@ class Hazard:
         self.forward += 1
         self.pipeline.move_instructions()
         for inst in stall_insts:
-            self.pipeline.pipeline[2].append(inst)
+            ex.append(inst)
         return True
         
     def war_hazards(self):
@@ -68,45 +157,46 @@ class Hazard:
         if not inst1 or (inst1.source1 is None and inst1.source2 is None):
             return False
 
-        all_forward_insts = []
-        for item in self.pipeline.pipeline[2:]:
-            if isinstance(item, list):
-                all_forward_insts.extend(item)
-            elif item is not None:
-                all_forward_insts.append(item)
         # Check against writers in EX, MEM, WB
-        for inst2 in all_forward_insts:
-            if inst2.destination is None:
-                continue
-            if inst1.source1 == inst2.destination or inst1.source2 == inst2.destination:
-                if self.forwarding:
-                    self.forward += 1
-                    return False
-                self.pipeline.move_instructions(from_index=2)
-                self.stall += 1
-                return True
+        writers = self.back_writers
+        if (inst1.source1 is not None and writers[inst1.source1] > 0) or (
+            inst1.source2 is not None and writers[inst1.source2] > 0
+        ):
+            if self.forwarding:
+                self.forward += 1
+                return False
+            self.pipeline.move_instructions(from_index=2)
+            self.stall += 1
+            return True
 
         return False
 
     def waw_hazards(self):
         wb_insts = self.pipeline.pipeline[4]  # WB stage
-        all_previous_insts = []
-        for item in self.pipeline.pipeline[:4]:
-            if isinstance(item, list):
-                all_previous_insts.extend(item)
-            elif item is not None:
-                all_previous_insts.append(item)
-
+        # only earlier-stage writers of the same register can conflict
+        front_writers = self.front_writers
+        if not any(front_writers[inst.destination] for inst in wb_insts):
+            return False
+        if_inst, id_inst, ex, mem_inst = self.pipeline.pipeline[:4]
+        previous = [if_inst, id_inst, *ex, mem_inst]
+        order = ex.order
         stall_wb = []
-        for prev in all_previous_insts:
+        for prev in previous:
+            if prev is None:
+                continue
             for wb_inst in wb_insts:
-                if prev.order > wb_inst.order and prev.destination == wb_inst.destination:
+                if (
+                    prev.destination == wb_inst.destination
+                    and order(prev) > wb_inst.order
+                ):
                     stall_wb.append(wb_inst)
         if len(stall_wb) == 0:
             return False
         self.forward += 1
         self.pipeline.move_instructions()
         self.pipeline.pipeline[-1].extend(stall_wb)
+        for inst in stall_wb:
+            self.track_back(inst, 1)
         return True
 
     def raw_hazards(self):
@@ -114,21 +204,14 @@ class Hazard:
         if not inst1 or inst1.destination is None:
             return False
 
-        all_forward_insts = []
-        for item in self.pipeline.pipeline[2:]:
-            if isinstance(item, list):
-                all_forward_insts.extend(item)
-            elif item is not None:
-                all_forward_insts.append(item)
-        # Check against writers in EX, MEM, WB
-        for inst2 in all_forward_insts:
-            if inst1.destination == inst2.source1 or inst1.destination == inst2.source2:
-                if self.forwarding:
-                    self.forward += 1
-                    return False
-                self.pipeline.move_instructions(from_index=2)
-                self.stall += 1
-                return True
+        # Check against readers in EX, MEM, WB
+        if self.back_readers[inst1.destination] > 0:
+            if self.forwarding:
+                self.forward += 1
+                return False
+            self.pipeline.move_instructions(from_index=2)
+            self.stall += 1
+            return True
 
         return False
 
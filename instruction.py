@@ -1,4 +1,34 @@
+import isa
+
+ISA = isa.load()["pipeline"]
+BRANCH_INSTS = frozenset(name for name, branch in zip(ISA.names, ISA.branch) if branch)
+NO_OP = ISA.opcode("NO_OP")
+
+
 class Instruction:
+    __slots__ = (
+        "label",
+        "command",
+        "name",
+        "stage",
+        "valid",
+        "branch",
+        "execution_clock",
+        "order",
+        "destination",
+        "source1",
+        "source2",
+        "pc",
+        "target",
+        "ex_seq",
+        "ex_tick",
+        "iid",
+        "opcode",
+        "prediction",
+        "history",
+        "outcome",
+    )
+
     def __init__(self, command, exe_clock=1):
         label = None
         try:
@@ -9,20 +39,60 @@ class Instruction:
         self.label = label
         self.command = command
         self.name = name
+        self.opcode = ISA.opcodes.get(name, ISA.NONE)
         self.stage = "IF"
         self.valid = True
         self.branch = None
         self.execution_clock = exe_clock
         self.order = 0
+        self.pc = None
+        self.target = None
+        self.ex_seq = None
+        self.ex_tick = 0
+        self.iid = None
+        self.prediction = None
+        self.history = 0
+        self.outcome = None
         self.init_source_destination(command)
 
+    @classmethod
+    def decoded(
+        cls, name, destination, source1, source2, branch=None, label=None, exe_clock=1,
+        pc=None, target=None,
+    ):
+        # build an instruction from already decoded fields, skipping the parser
+        inst = cls.__new__(cls)
+        inst.label = label
+        inst.name = name
+        inst.opcode = ISA.opcodes.get(name, ISA.NONE)
+        inst.stage = "IF"
+        inst.valid = True
+        inst.branch = branch
+        inst.execution_clock = exe_clock
+        inst.order = 0
+        inst.destination = destination
+        inst.source1 = source1
+        inst.source2 = source2
+        inst.pc = pc
+        inst.target = target
+        inst.ex_seq = None
+        inst.ex_tick = 0
+        inst.iid = None
+        inst.prediction = None
+        inst.history = 0
+        inst.outcome = None
+        if branch is None:
+            inst.command = f"{name} {destination} {source1} {source2}"
+        else:
+            inst.command = f"{name} {source1} {source2} {branch}"
+        return inst
+
     def __repr__(self):
         return self.command
 
     def init_source_destination(self, command):
         name, input1, input2, input3 = command.strip().split(" ")
-        branch_insts = ["BEQ", "BNE", "BGTZ", "BLTZ", "BGEZ", "BLEZ"]
-        if name in branch_insts:
+        if name in BRANCH_INSTS:
             self.branch = input3
             self.destination = None
             self.source1 = input1
@@ -35,6 +105,10 @@ class Instruction:
     def noop_instuction(self):
         self.command = "NO_OP"
         self.name = "NO_OP"
+        self.opcode = NO_OP
+        self.outcome = None
+        self.branch = None
+        self.target = None
         self.execution_clock = 0
         self.destination = None
         self.source1 = None
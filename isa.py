@@ -0,0 +1,57 @@
+import json
+import os
+from functools import lru_cache
+
+# Instruction sets of the three engines, described in isa.json:
+#
+#   units    functional unit classes and their engine-specific settings
+#   latency  default latency of an op, an int or per-stage cycles
+#   ops      mnemonic -> unit, plus optional latency, stages, and the
+#            branch / halt flags
+#
+# Each engine's set is compiled into flat lists indexed by an integer
+# opcode, numbered in file order, so simulators look up an op's unit or
+# latency by index instead of hashing its mnemonic every cycle.
+PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "isa.json")
+
+
+class ISA:
+    NONE = -1
+
+    def __init__(self, spec):
+        self.unit_config = spec.get("units", {})
+        self.units = list(self.unit_config)  # unit index -> name
+        self.names = list(spec["ops"])  # opcode -> mnemonic
+        self.opcodes = {name: op for op, name in enumerate(self.names)}
+        self.unit = []  # opcode -> unit index or NONE
+        self.latency = []
+        self.stages = []
+        self.branch = []
+        self.halt = []
+        unit_index = {name: index for index, name in enumerate(self.units)}
+        for name, op in spec["ops"].items():
+            unit = op.get("unit")
+            if unit is not None and unit not in unit_index:
+                raise ValueError(f"{name} runs on undefined unit {unit!r}")
+            self.unit.append(self.NONE if unit is None else unit_index[unit])
+            self.latency.append(op.get("latency", spec.get("latency")))
+            self.stages.append(tuple(op.get("stages", ())))
+            self.branch.append(op.get("branch", False))
+            self.halt.append(op.get("halt", False))
+
+    def opcode(self, name):
+        try:
+            return self.opcodes[name]
+        except KeyError:
+            raise ValueError(f"unknown opcode {name!r}") from None
+
+    def ops(self, unit):
+        # mnemonics of the ops that run on a unit
+        index = self.units.index(unit)
+        return [name for name, u in zip(self.names, self.unit) if u == index]
+
+
+@lru_cache(maxsize=None)
+def load(path=PATH):
+    with open(path) as spec:
+        return {engine: ISA(engine_spec) for engine, engine_spec in json.load(spec).items()}
@@ -1,3 +1,11 @@
+import argparse
+import copy
+import time
+
+import predictor
+import profiler
+import timeline
+import tracer
 from pipeline import Pipeline
 
 p = Pipeline()
@@ -33,10 +41,67 @@ def inst_waw_hazard():
     p.add_instruction("ADD R1 R5 R6", 1)
 
 
+def compare_modes():
+    # run the loaded program cycle by cycle and fast-forwarded, each on a
+    # copy of the configured pipeline (without its tracer) that shares
+    # the instruction table
+    results = []
+    for fast_forward in (False, True):
+        q = copy.deepcopy(p, {id(p.instructions): p.instructions})
+        q.fast_forward = fast_forward
+        start = time.perf_counter()
+        q.run()
+        results.append((q.counters(), time.perf_counter() - start))
+    for name, (counters, seconds) in zip(("cycle-by-cycle", "fast-forward"), results):
+        print(f"{name:<16}{seconds:>10.4f}s  {counters}")
+    print(f"identical: {results[0][0] == results[1][0]}")
+
+
 if __name__ == "__main__":
-    # inst_war_hazard()
-    inst_raw_hazard()
-    # inst_control_hazard()
-    # inst_structural_hazard()
-    # inst_waw_hazard()
-    p.run()
+    parser = argparse.ArgumentParser(description="Run the 5-stage pipeline.")
+    parser.add_argument("program", nargs="?", help="assembly file to run")
+    parser.add_argument(
+        "--no-fast-forward",
+        action="store_true",
+        help="simulate every cycle even when only EX countdowns happen",
+    )
+    parser.add_argument(
+        "--compare-modes",
+        action="store_true",
+        help="run cycle by cycle and fast-forwarded and compare the counters",
+    )
+    parser.add_argument(
+        "--predictor",
+        choices=list(predictor.PREDICTORS),
+        help="predict branches and resolve them against their real outcomes",
+    )
+    parser.add_argument("--entries", type=int, default=1024, help="predictor counters")
+    parser.add_argument("--history", type=int, default=8, help="gshare history bits")
+    parser.add_argument(
+        "--window",
+        type=int,
+        help="keep the timeline of only this many recent instructions",
+    )
+    tracer.add_arguments(parser)
+    timeline.add_arguments(parser)
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+    p.tracer = tracer.from_arguments(args)
+    if args.predictor:
+        p.predictor = predictor.create(args.predictor, args.entries, args.history)
+    p.fast_forward = not args.no_fast_forward
+    p.window = args.window
+    if args.program:
+        p.load(args.program)
+    else:
+        # inst_war_hazard()
+        inst_raw_hazard()
+        # inst_control_hazard()
+        # inst_structural_hazard()
+        # inst_waw_hazard()
+    if args.compare_modes:
+        compare_modes()
+    else:
+        with p.tracer:
+            profiler.run(args, p)
+        timeline.report(args, p.timeline, diagram=True)
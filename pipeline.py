@@ -1,96 +1,413 @@
-from instruction import Instruction
+import heapq
+from array import array
+
+import tracefile
+from assembler import Assembler, InstructionTable
+from core import FunctionalCore
 from hazard import Hazard
+from predictor import BTB, BranchStats
+from timeline import Timeline
+from tracer import NullTracer
 
 
-class Pipeline:
+class ExecuteStage:
+    # The EX slot. Instead of decrementing every instruction's clock each
+    # cycle the stage counts its own ticks, and an instruction's
+    # `execution_clock` and `order` hold their values as of the tick at
+    # which it entered (`ex_tick`). A min-heap keyed by the tick at which
+    # each instruction runs out finds the finished ones without touching
+    # the rest. Iteration follows issue order, like the list it replaces,
+    # and so does the choice between several finished instructions.
+    def __init__(self):
+        self.insts = {}  # in issue order
+        self.completions = []  # (completion tick, seq, inst)
+        self.ready = []  # (seq, inst) whose clock has run out
+        self.ticks = 0
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.insts)
+
+    def __iter__(self):
+        return iter(self.insts)
+
+    def __repr__(self):
+        return repr(list(self.insts))
+
+    def append(self, inst):
+        self.seq += 1
+        inst.ex_seq = self.seq
+        inst.ex_tick = self.ticks
+        self.insts[inst] = None
+        heapq.heappush(
+            self.completions, (self.ticks + inst.execution_clock, self.seq, inst)
+        )
+
+    def remove(self, inst):
+        # heap entries of a removed instruction are dropped lazily, their
+        # seq no longer matches
+        del self.insts[inst]
+        inst.execution_clock = self.execution_clock(inst)
+        inst.order = self.order(inst)
+        inst.ex_seq = None
+
+    def tick(self, cycles=1):
+        self.ticks += cycles
+
+    def execution_clock(self, inst):
+        if inst.ex_seq is None:
+            return inst.execution_clock
+        return inst.execution_clock - (self.ticks - inst.ex_tick)
+
+    def order(self, inst):
+        if inst.ex_seq is None:
+            return inst.order
+        return inst.order + (self.ticks - inst.ex_tick)
+
+    def collect(self):
+        completions = self.completions
+        while completions and completions[0][0] <= self.ticks:
+            _, seq, inst = heapq.heappop(completions)
+            if inst.ex_seq == seq:
+                heapq.heappush(self.ready, (seq, inst))
+        ready = self.ready
+        while ready and ready[0][1].ex_seq != ready[0][0]:
+            heapq.heappop(ready)
+
+    def pop_ready(self):
+        # the first instruction in issue order whose clock has run out
+        self.collect()
+        if not self.ready:
+            return None
+        _, inst = heapq.heappop(self.ready)
+        self.remove(inst)
+        return inst
+
+    def cycles_to_completion(self):
+        # ticks until the next instruction runs out, 0 if one already has
+        self.collect()
+        if self.ready:
+            return 0
+        completions = self.completions
+        while completions and completions[0][2].ex_seq != completions[0][1]:
+            heapq.heappop(completions)
+        if not completions:
+            return 0
+        return completions[0][0] - self.ticks
+
+
+class WritebackStage:
+    # The WB slot. Every cycle retires the instructions with the highest
+    # `order`, which is final once an instruction leaves EX, and the rest
+    # wait. Instructions are grouped by order, the orders kept in a
+    # max-heap, so retiring touches only the instructions that leave.
+    # Iteration follows arrival, like the list it replaces; a WAW stall
+    # may put an instruction back more than once.
     def __init__(self):
+        self.insts = {}  # seq -> inst, in arrival order
+        self.groups = {}  # order -> seqs of its instructions
+        self.orders = []  # -order of every group
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.insts)
+
+    def __iter__(self):
+        return iter(self.insts.values())
+
+    def __repr__(self):
+        return repr(list(self.insts.values()))
+
+    def append(self, inst):
+        self.seq += 1
+        self.insts[self.seq] = inst
+        group = self.groups.get(inst.order)
+        if group is None:
+            group = self.groups[inst.order] = []
+            heapq.heappush(self.orders, -inst.order)
+        group.append(self.seq)
+
+    def extend(self, insts):
+        for inst in insts:
+            self.append(inst)
+
+    def retire(self):
+        # removes and returns the instructions with the highest order
+        if not self.orders:
+            return []
+        seqs = self.groups.pop(-heapq.heappop(self.orders))
+        return [self.insts.pop(seq) for seq in seqs]
+
+
+class Pipeline:
+    def __init__(
+        self, tracer=None, fast_forward=True, predictor=None, btb=None, window=None
+    ):
         self.stages = ["IF", "ID", "EX", "MEM", "WB"]
-        self.pipeline = [None, None, [], None, []]
+        self.pipeline = [None, None, ExecuteStage(), None, WritebackStage()]
         self.clock = 0
-        self.instructions = []
-        self.completed_instructions = []
+        self.instructions = InstructionTable()
         self.instruction_pointer = 0
         self.hazard = Hazard(self)
         self.branch_inst = True
+        # With a predictor, fetch follows its guesses and a functional model
+        # of the program (the oracle) supplies every branch's real next pc,
+        # so only a mispredict flushes. Without one `branch_inst` treats
+        # every branch as taken or as not taken.
+        self.predictor = predictor
+        self.btb = BTB() if btb is None else btb
+        self.branch_stats = BranchStats()
+        self.oracle = None
+        self.wrong_path = False
+        self.assembler = Assembler()
+        self.tracer = NullTracer() if tracer is None else tracer
+        # stage-entry cycles per fetched instruction, and the pc it came from
+        self.timeline = Timeline(self.stages, self.label)
+        self.fetched = array("i")
+        # With a window only the last `window` fetched instructions keep
+        # their timeline rows and the oracle decodes rows as it reaches
+        # them, so a long run over a mapped trace (see `stream`) holds no
+        # per-instruction state once instructions leave WB.
+        self.window = window
+        # jump over cycles in which only EX countdowns happen, unless the
+        # tracer has to see every cycle
+        self.fast_forward = fast_forward
 
     def add_instruction(self, instruction_name, exe_clock=1):
-        self.instructions.append(Instruction(instruction_name, exe_clock))
+        self.assembler.assemble_instruction(self.instructions, instruction_name, exe_clock)
+
+    def load(self, path):
+        # a program file through the compiled trace cache, unless there are
+        # instructions to append it to
+        if len(self.instructions):
+            self.assembler.assemble_file(path, self.instructions)
+        else:
+            self.instructions = InstructionTable.from_trace(tracefile.load(path))
+
+    def stream(self, lines, path):
+        # Runs a program from an iterable of lines, e.g. a generator, too
+        # long to hold: it is compiled chunk by chunk to the trace file at
+        # `path`, whose mapped columns fetch then reads and branches jump
+        # through by row.
+        tracefile.build(lines, path)
+        self.instructions = InstructionTable.from_trace(tracefile.open_mapped(path))
 
     def move_instructions(self, from_index=0):
-        max_order = max([obj.order for obj in self.pipeline[-1]], default=None)
-        self.pipeline[-1] = [obj for obj in self.pipeline[-1] if obj.order != max_order]
+        entered = self.timeline.columns
+        first = self.timeline.first
+        for inst in self.pipeline[-1].retire():
+            self.hazard.track_back(inst, -1)
         for i in range(len(self.stages) - 1, from_index, -1):
             if i == 2:  # Ex stage
-                for item in self.pipeline[i]:
-                    item.execution_clock -= 1
-                    item.order += 1
+                self.pipeline[i].tick()
                 if self.pipeline[i - 1]:
                     inst = self.pipeline[i - 1]
                     inst.execution_clock -= 1
                     inst.stage = self.stages[i]
+                    entered[i][inst.iid - first] = self.clock
                     self.pipeline[i].append(inst)
                     self.pipeline[i - 1] = None
+                    self.hazard.track_back(inst, 1)
             elif i == 3:  # Mem stage
-                for idx, item in enumerate(self.pipeline[i - 1] or []):
-                    if item.execution_clock <= 0:
-                        inst = self.pipeline[2].pop(idx)
-                        self.pipeline[i] = inst
-                        inst.stage = self.stages[i]
-                        break
+                inst = self.pipeline[i - 1].pop_ready()
+                if inst is not None:
+                    self.pipeline[i] = inst
+                    inst.stage = self.stages[i]
+                    entered[i][inst.iid - first] = self.clock
             elif i == 4 and self.pipeline[i - 1]:
                 inst = self.pipeline[i - 1]
                 inst.stage = self.stages[i]
+                entered[i][inst.iid - first] = self.clock
                 self.pipeline[i].append(inst)
                 self.pipeline[i - 1] = None
+                self.hazard.track_front(inst, -1)
             elif self.pipeline[i - 1]:
                 self.pipeline[i] = self.pipeline[i - 1]
                 self.pipeline[i - 1] = None
                 self.pipeline[i].stage = self.stages[i]
+                entered[i][self.pipeline[i].iid - first] = self.clock
 
     def insert_instruction(self):
         if (
-            self.instructions
-            and self.pipeline[0] is None
+            self.pipeline[0] is None
             and self.instruction_pointer < len(self.instructions)
         ):
-            new_instr = self.instructions[self.instruction_pointer]
+            new_instr = self.instructions.fetch(self.instruction_pointer)
             self.pipeline[0] = new_instr
             new_instr.stage = "IF"
-            self.instruction_pointer += 1
+            new_instr.iid = self.timeline.add()
+            self.timeline.columns[0][-1] = self.clock
+            self.fetched.append(self.instruction_pointer)
+            if self.window is not None and len(self.fetched) >= 2 * self.window:
+                self.release()
+            if self.predictor is None:
+                self.instruction_pointer += 1
+            else:
+                self.instruction_pointer = self.predict(new_instr)
+            self.hazard.track_front(new_instr, 1)
+
+    def release(self):
+        # drops the timeline rows of all but the last `window` fetched
+        # instructions, never those of an instruction still in flight
+        in_flight = [inst.iid for inst in self.pipeline[2]] + [
+            inst.iid for inst in self.pipeline[4]
+        ]
+        in_flight += [
+            self.pipeline[k].iid for k in (0, 1, 3) if self.pipeline[k] is not None
+        ]
+        keep = min(in_flight + [len(self.timeline) - self.window])
+        count = keep - self.timeline.first
+        if count > 0:
+            self.timeline.release(count)
+            del self.fetched[:count]
+
+    def predict(self, inst):
+        # the pc to fetch after `inst`; the oracle executes every instruction
+        # fetched on the correct path, branches keep their real next pc in
+        # `outcome` for EX to check the guess against
+        pc = inst.pc
+        next_pc = pc + 1
+        if inst.target is not None and self.predictor.predict(pc):
+            target = self.btb.lookup(pc)
+            if target is not None:
+                next_pc = target
+        inst.prediction = next_pc
+        inst.history = self.predictor.history
+        if not self.wrong_path:
+            self.oracle.run(1)
+            if inst.target is not None:
+                inst.outcome = self.oracle.pc
+                self.wrong_path = self.oracle.pc != next_pc
+        return next_pc
 
     def step(self):
         self.clock += 1
-        print(f"\nClock Cycle {self.clock}:")
 
         valid = self.hazard.validate()
         if valid:
             self.move_instructions()
 
         self.insert_instruction()
-        self.print_pipeline()
+        self.tracer.cycle(self)
 
-    def print_pipeline(self):
+    def quiet_cycles(self):
+        # Number of upcoming cycles whose only effect is the countdown of
+        # the instructions in EX: nothing to fetch, every other stage empty,
+        # no hazard that would fire and nothing in EX ready to leave it.
+        ex = self.pipeline[2]
+        if (
+            not ex
+            or self.pipeline[0] is not None
+            or self.pipeline[1] is not None
+            or self.pipeline[3] is not None
+            or self.pipeline[4]
+            or self.instruction_pointer < len(self.instructions)
+            or self.hazard.branch_in_execution()
+            or self.hazard.structural_conflict()
+        ):
+            return 0
+        return ex.cycles_to_completion()
+
+    def skip_quiet_cycles(self, until=None):
+        cycles = self.quiet_cycles()
+        if until is not None:
+            cycles = min(cycles, until - self.clock - 1)
+        if cycles <= 0:
+            return 0
+        self.pipeline[2].tick(cycles)
+        self.clock += cycles
+        self.tracer.skipped(self, cycles)
+        return cycles
+
+    def label(self, iid):
+        return self.instructions.fetch(self.fetched[iid - self.timeline.first]).command
+
+    def counters(self):
+        counters = {
+            "cycles": self.clock,
+            "stalls": self.hazard.stall,
+            "forwards": self.hazard.forward,
+            "flushes": self.hazard.flush,
+        }
+        if self.predictor is not None:
+            branches, mispredicts, _ = self.branch_stats.totals()
+            counters["branches"] = branches
+            counters["mispredicts"] = mispredicts
+        return counters
+
+    def snapshot(self):
+        stages = {}
+        for idx, instr in enumerate(self.pipeline):
+            if idx in (2, 4):
+                stages[self.stages[idx]] = [repr(i) for i in instr]
+            else:
+                stages[self.stages[idx]] = None if instr is None else repr(instr)
+        return {"clock": self.clock, "stages": stages}
+
+    def render_cycle(self):
+        lines = [f"\nClock Cycle {self.clock}:"]
         for idx, instr in enumerate(self.pipeline):
             stage_name = self.stages[idx]
             if instr:
-                print(f"{stage_name}: {instr}")
+                lines.append(f"{stage_name}: {instr}")
             else:
-                print(f"{stage_name}: Empty")
+                lines.append(f"{stage_name}: Empty")
+        lines.append("")
+        return "\n".join(lines)
+
+    def render_summary(self):
+        summary = (
+            f"\nStall Numbers: {self.hazard.stall}\n"
+            f"Forward Numbers: {self.hazard.forward}\n"
+            f"Cycles: {self.clock}\n"
+        )
+        if self.predictor is not None:
+            label = lambda pc: self.instructions.fetch(pc).command
+            summary += f"\n{self.branch_stats.render(label)}\n"
+        return summary
 
-    def run(self):
-        any_inst = False
+    def print_pipeline(self):
+        print(self.render_cycle(), end="")
+
+    def run(self, until=None):
+        # with `until` the run stops once that cycle has been simulated and
+        # can be resumed later by calling run again
+        self.instructions.link()
+        if self.predictor is not None and self.oracle is None:
+            self.oracle = FunctionalCore.from_table(
+                self.instructions, lazy=self.window is not None
+            )
+            self.oracle.pc = self.instruction_pointer
+        any_inst = any(self.pipeline)
         while self.instruction_pointer < len(self.instructions) or any_inst:
-            any_inst = False
-            for item in self.pipeline:
-                if isinstance(item, list):
-                    any_inst = any(item)
-                elif item is not None:
-                    any_inst = True
-                if any_inst:
-                    break
+            if until is not None and self.clock >= until:
+                return
+            any_inst = any(self.pipeline)
             if self.instruction_pointer < len(self.instructions) or any_inst:
+                if self.fast_forward and not self.tracer.per_cycle:
+                    self.skip_quiet_cycles(until)
                 self.step()
-        
-        print(f"\nStall Numbers: {self.hazard.stall}")
-        print(f"Forward Numbers: {self.hazard.forward}")
-        print(f"Cycles: {self.clock}")
+        self.tracer.summary(self)
+
+    # timed in a profiled run, see profiler.py
+    PHASES = {
+        "step": step,
+        "hazard.control": Hazard.control_hazards,
+        "hazard.structural": Hazard.structural_hazards,
+        "hazard.raw": Hazard.raw_hazards,
+        "hazard.waw": Hazard.waw_hazards,
+        "hazard.war": Hazard.war_hazards,
+        "move_instructions": move_instructions,
+        "insert_instruction": insert_instruction,
+        "skip_quiet_cycles": skip_quiet_cycles,
+    }
+
+    def __getstate__(self):
+        # tracers own open files, a restored pipeline gets a NullTracer
+        state = self.__dict__.copy()
+        del state["tracer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tracer = NullTracer()
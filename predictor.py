@@ -0,0 +1,130 @@
+from array import array
+
+# Branch predictors for the 5-stage pipeline. At fetch a predictor guesses
+# whether the branch at a pc is taken and the BTB supplies the target of a
+# taken guess; without a BTB hit fetch goes on down the fall-through path.
+# Both learn the real outcome when the branch resolves in EX. The global
+# history of gshare only holds resolved branches, so a branch passes the
+# `history` it was predicted with back to `update`.
+
+
+class StaticPredictor:
+    history = 0
+
+    def __init__(self, taken=False):
+        self.taken = taken
+
+    def predict(self, pc):
+        return self.taken
+
+    def update(self, pc, taken, history=0):
+        pass
+
+
+class BimodalPredictor:
+    # 2-bit saturating counters indexed by the low bits of the pc, 0 and 1
+    # predict not taken, 2 and 3 taken
+    history = 0
+
+    def __init__(self, entries=1024):
+        if entries < 1 or entries & (entries - 1):
+            raise ValueError(f"entries must be a power of two, got {entries}")
+        self.mask = entries - 1
+        self.counters = bytearray([1]) * entries
+
+    def index(self, pc, history=0):
+        return pc & self.mask
+
+    def predict(self, pc):
+        return self.counters[self.index(pc, self.history)] >= 2
+
+    def update(self, pc, taken, history=0):
+        index = self.index(pc, history)
+        counter = self.counters[index]
+        if taken:
+            self.counters[index] = min(counter + 1, 3)
+        else:
+            self.counters[index] = max(counter - 1, 0)
+
+
+class GSharePredictor(BimodalPredictor):
+    # bimodal counters indexed by the pc xor the last `history` outcomes
+    def __init__(self, entries=1024, history=8):
+        super().__init__(entries)
+        self.history_mask = (1 << history) - 1
+        self.history = 0
+
+    def index(self, pc, history=0):
+        return (pc ^ history) & self.mask
+
+    def update(self, pc, taken, history=0):
+        super().update(pc, taken, history)
+        self.history = ((self.history << 1) | taken) & self.history_mask
+
+
+class BTB:
+    # direct-mapped branch target buffer, pc -> target of its last taken run
+    NONE = -1
+
+    def __init__(self, entries=256):
+        self.entries = entries
+        self.tags = array("i", [self.NONE]) * entries
+        self.targets = array("i", [self.NONE]) * entries
+
+    def lookup(self, pc):
+        slot = pc % self.entries
+        if self.tags[slot] != pc:
+            return None
+        return self.targets[slot]
+
+    def update(self, pc, target):
+        slot = pc % self.entries
+        self.tags[slot] = pc
+        self.targets[slot] = target
+
+
+PREDICTORS = {
+    "not-taken": lambda entries, history: StaticPredictor(False),
+    "taken": lambda entries, history: StaticPredictor(True),
+    "bimodal": lambda entries, history: BimodalPredictor(entries),
+    "gshare": lambda entries, history: GSharePredictor(entries, history),
+}
+
+
+def create(name, entries=1024, history=8):
+    try:
+        factory = PREDICTORS[name]
+    except KeyError:
+        raise ValueError(f"unknown predictor {name!r}") from None
+    return factory(entries, history)
+
+
+class BranchStats:
+    # per-branch outcomes: pc -> [resolved, mispredicted, flushed cycles]
+    def __init__(self):
+        self.branches = {}
+
+    def record(self, pc, mispredicted, flushed):
+        counts = self.branches.setdefault(pc, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += mispredicted
+        counts[2] += flushed
+
+    def totals(self):
+        return [sum(counts[k] for counts in self.branches.values()) for k in range(3)]
+
+    def render(self, label=str, label_width=18):
+        lines = [
+            f"{'Branch':<{label_width}}{'pc':>6}{'Resolved':>10}{'Mispred':>9}"
+            f"{'Accuracy':>10}{'Flushed':>9}"
+        ]
+        rows = sorted(self.branches.items())
+        rows.append((None, self.totals()))
+        for pc, (resolved, mispredicted, flushed) in rows:
+            accuracy = 1 - mispredicted / resolved if resolved else 1.0
+            name = "total" if pc is None else label(pc)
+            lines.append(
+                f"{name:<{label_width}}{'' if pc is None else pc:>6}{resolved:>10}"
+                f"{mispredicted:>9}{accuracy:>10.1%}{flushed:>9}"
+            )
+        return "\n".join(lines)
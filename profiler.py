@@ -0,0 +1,78 @@
+import cProfile
+import pstats
+import time
+
+# Profiled runs. The simulators carry no timing code of their own: a
+# profiled run executes under cProfile and its per-function call counts
+# and times are the phase counters, so an ordinary run pays nothing for
+# them.
+#
+# An engine names its phases in PHASES, phase -> function. `report` reads
+# those functions out of the profile: calls, inclusive seconds and their
+# share of the run, plus wall time per simulated cycle. Times are as
+# measured under the profiler, which slows every call it sees. The dump is
+# a pstats file, as read by pstats, snakeviz, gprof2dot or flameprof.
+
+
+class Profile:
+    def __init__(self, engine):
+        self.engine = engine
+        self.profile = cProfile.Profile()
+        self.seconds = 0.0
+
+    def run(self, *args, **kwargs):
+        start = time.perf_counter()
+        self.profile.enable()
+        try:
+            return self.engine.run(*args, **kwargs)
+        finally:
+            self.profile.disable()
+            self.seconds += time.perf_counter() - start
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+    def phases(self):
+        # phase -> (calls, inclusive seconds)
+        stats = pstats.Stats(self.profile).stats
+        phases = {}
+        for phase, function in self.engine.PHASES.items():
+            code = function.__code__
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            _, calls, _, seconds, _ = stats.get(key, (0, 0, 0.0, 0.0, None))
+            phases[phase] = calls, seconds
+        return phases
+
+    def render(self):
+        cycles = self.engine.counters()["cycles"]
+        lines = [f"{'Phase':<24}{'Calls':>10}{'Seconds':>10}{'us/call':>10}{'Share':>8}"]
+        for phase, (calls, seconds) in self.phases().items():
+            per_call = seconds / calls * 1e6 if calls else 0.0
+            share = seconds / self.seconds if self.seconds else 0.0
+            lines.append(
+                f"{phase:<24}{calls:>10}{seconds:>10.4f}{per_call:>10.2f}{share:>8.1%}"
+            )
+        per_cycle = self.seconds / cycles * 1e6 if cycles else 0.0
+        lines.append(
+            f"\nrun: {self.seconds:.4f}s for {cycles} cycles, {per_cycle:.2f} us/cycle"
+        )
+        return "\n".join(lines)
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="profile the run, print the time per phase and write a pstats dump",
+    )
+
+
+def run(args, engine):
+    # runs `engine`, under the profiler when asked for
+    if not args.profile:
+        engine.run()
+        return
+    profile = Profile(engine)
+    profile.run()
+    profile.dump(args.profile)
+    print(profile.render())
@@ -0,0 +1,142 @@
+import glob
+import hashlib
+import os
+import pickle
+import zlib
+from array import array
+from functools import lru_cache
+
+import tracefile
+from timeline import Timeline
+
+# Simulation results on disk, keyed by everything that determines them:
+# the engine, the content of the trace, the parameters of the run and the
+# simulator version, a hash of the simulator sources and isa.json. Editing
+# any of them misses the old entries instead of returning stale numbers.
+#
+# An entry is one file holding zlib(pickle({"metrics": ..., "timeline":
+# ...})). The per-instruction timeline is only stored by a cache opened
+# with `timelines`, which also misses entries stored without one. A hit
+# refreshes the file's mtime. A cache counts the bytes it writes on top of one scan of
+# the directory, and only once that passes `max_bytes` does it scan again
+# and remove the entries used longest ago, down to three quarters of the
+# limit, so a sweep of N jobs does not scan the directory N times. Several
+# processes may share a directory; each keeps its own count and the next
+# scan sees what the others wrote.
+VERSION = 2
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCES = ["*.py", "isa.json", "scoreboard/*.py", "tomasulo/*.py"]
+
+
+@lru_cache(maxsize=None)
+def simulator_version():
+    version = hashlib.blake2b(digest_size=16)
+    for pattern in SOURCES:
+        for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+            version.update(os.path.relpath(path, ROOT).encode())
+            with open(path, "rb") as source:
+                version.update(source.read())
+    return version.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def open_cache(directory, max_bytes, timelines):
+    # the ResultCache of this process for a directory, so its byte count
+    # carries over from one job to the next
+    return ResultCache(directory, max_bytes, timelines)
+
+
+class ResultCache:
+    def __init__(self, directory=None, max_bytes=256 << 20, timelines=False):
+        if directory is None:
+            directory = tracefile.cache_dir("RESULT_CACHE", "pipeline-results")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timelines = timelines  # store the timeline with the metrics
+        self.size = None  # bytes in the directory, as far as this process knows
+
+    def __reduce__(self):
+        # unpickled in a worker, a cache is that worker's shared instance
+        return open_cache, (self.directory, self.max_bytes, self.timelines)
+
+    def key(self, engine, trace_digest, params):
+        config = (VERSION, simulator_version(), engine, trace_digest, sorted(params.items()))
+        return hashlib.blake2b(repr(config).encode(), digest_size=16).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.result")
+
+    def get(self, key):
+        # {"metrics": ..., "timeline": Timeline or None}, or None on a miss
+        path = self.path(key)
+        try:
+            with open(path, "rb") as entry:
+                data = entry.read()
+        except FileNotFoundError:
+            return None
+        result = pickle.loads(zlib.decompress(data))
+        if self.timelines and result["timeline"] is None:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        if result["timeline"] is not None:
+            stages, first, columns = result["timeline"]
+            result["timeline"] = Timeline(stages)
+            result["timeline"].first = first
+            result["timeline"].columns = [array("i", column) for column in columns]
+        return result
+
+    def put(self, key, metrics, timeline=None):
+        stored = None
+        if timeline is not None:
+            stored = (
+                timeline.stages,
+                timeline.first,
+                [column.tobytes() for column in timeline.columns],
+            )
+        data = zlib.compress(pickle.dumps({"metrics": metrics, "timeline": stored}))
+        os.makedirs(self.directory, exist_ok=True)
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.entries())
+        path = self.path(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as entry:
+            entry.write(data)
+        os.replace(temporary, path)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        # (mtime, size, path) of every entry, oldest first
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".result"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
+        self.size = 0
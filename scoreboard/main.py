@@ -1,233 +1,370 @@
 # import sys
-# from collections import deque, defaultdict
-
-ISA = {
-    "LD": {"fu": "LS", "cycles": None},
-    "ST": {"fu": "LS", "cycles": None},
-    "BRZ": {"fu": "BR", "cycles": None},
-    "BRNZ": {"fu": "BR", "cycles": None},
-    "ADD": {"fu": "ALU", "cycles": None},
-    "SUB": {"fu": "ALU", "cycles": None},
-    "ROR": {"fu": "ALU", "cycles": None},
-    "ROL": {"fu": "ALU", "cycles": None},
-    "SHR": {"fu": "ALU", "cycles": None},
-    "SHL": {"fu": "ALU", "cycles": None},
-    "OUT": {"fu": "IO", "cycles": None},
-    "AND": {"fu": "ALU", "cycles": None},
-    "OR": {"fu": "ALU", "cycles": None},
-    "XOR": {"fu": "ALU", "cycles": None},
-    "NOT": {"fu": "ALU", "cycles": None},
-    "HLT": {"fu": "CTRL", "cycles": None},
-}
+import argparse
+import bisect
+import heapq
+from collections import Counter, defaultdict, deque
+
+import isa
+import profiler
+import timeline
+import tracefile
+import tracer
+from timeline import Timeline
+from tracer import NullTracer
+
+ISA = isa.load()["scoreboard"]
+TIMING = {name: dict(latency) for name, latency in zip(ISA.names, ISA.latency)}
+FU_CONFIG = {name: unit["count"] for name, unit in ISA.unit_config.items()}
 
 
 class Instruction:
     def __init__(self, op, dest, src1=None, src2=None):
         self.op = op
+        self.opcode = ISA.opcode(op)
         self.dest = dest
         self.src1 = src1
         self.src2 = src2
-        self.stage_cycles = {}
         self.remaining_exec = 0
+        # register operands, immediates are plain digits
+        self.registers = {r for r in (dest, src1, src2) if r and not r.isdigit()}
+        self.phase = None  # ISS, RO, EX or WB once issued
+        self.iid = None  # position in the program, also the timeline row
+        self.pending = 0  # registers still named by an older windowed instruction
 
     def __str__(self):
         return f"{self.op} {self.dest}:{self.src1},{self.src2}"
 
 
 class FunctionalUnit:
+    # The units of one class as parallel arrays indexed by unit number. The
+    # reserved and busy flags are bit masks, and the lowest set bit of a
+    # mask is the first free unit, so allocation and release never scan the
+    # units. `executing` holds the busy unit numbers for `step`.
     def __init__(self, name, count):
         self.name = name
-        self.units = [
-            {
-                "reserved": False,
-                "busy": False,
-                "op": None,
-                "instr": None,
-                "remaining": 0,
-            }
-            for _ in range(count)
-        ]
+        self.count = count
+        self.op = [None] * count
+        self.instr = [None] * count
+        self.remaining = [0] * count
+        self.all = (1 << count) - 1
+        self.unreserved = self.all
+        self.busy = 0
+        self.executing = set()
+        # windowed instructions of this class free to issue, in program order
+        self.ready = []
 
-    def allocate(self, instr, cycle, exec_cycles):
-        for u in self.units:
-            if not u["busy"]:
-                u.update(
-                    {
-                        "reserved": True,
-                        "busy": True,
-                        "op": instr.op,
-                        "instr": instr,
-                        "remaining": exec_cycles,
-                    }
-                )
-                instr.stage_cycles["EX"] = cycle
-                instr.remaining_exec = exec_cycles
-                return True
-        return False
+    def is_busy(self, unit):
+        return bool(self.busy >> unit & 1)
+
+    def is_reserved(self, unit):
+        return not self.unreserved >> unit & 1
+
+    def reserve(self):
+        # issue reserves the first unreserved unit
+        free = self.unreserved
+        unit = (free & -free).bit_length() - 1
+        self.unreserved ^= 1 << unit
+
+    def release(self):
+        # write back releases the first reserved unit that is not executing
+        held = self.all & ~self.unreserved & ~self.busy
+        unit = (held & -held).bit_length() - 1
+        self.unreserved |= 1 << unit
+
+    def allocate(self, instr, exec_cycles):
+        idle = self.all & ~self.busy
+        if not idle:
+            return False
+        unit = (idle & -idle).bit_length() - 1
+        self.unreserved &= ~(1 << unit)
+        self.busy |= 1 << unit
+        self.op[unit] = instr.op
+        self.instr[unit] = instr
+        self.remaining[unit] = exec_cycles
+        self.executing.add(unit)
+        instr.remaining_exec = exec_cycles
+        return True
 
     def step(self):
         finished = []
-        for u in self.units:
-            if u["busy"]:
-                u["remaining"] -= 1
-                if u["remaining"] <= 0:
-                    finished.append(u["instr"])
-                    u.update(
-                        {
-                            "reserved": True,
-                            "busy": False,
-                            "op": None,
-                            "instr": None,
-                            "remaining": 0,
-                        }
-                    )
+        for unit in list(self.executing):
+            self.remaining[unit] -= 1
+            if self.remaining[unit] <= 0:
+                finished.append(self.instr[unit])
+                self.busy &= ~(1 << unit)
+                self.op[unit] = None
+                self.instr[unit] = None
+                self.remaining[unit] = 0
+                self.executing.discard(unit)
         return finished
 
 
 class Scoreboard:
-    def __init__(self, instructions, timing, fu_config):
+    def __init__(self, instructions, timing, fu_config, tracer=None, window=None):
+        if window is not None and window < 1:
+            raise ValueError(f"the issue window needs at least one entry, got {window}")
         self.instructions = instructions
+        self.tracer = NullTracer() if tracer is None else tracer
         self.timing = timing
         self.RS = {f"R{i}": None for i in range(8)}
         self.FUs = {name: FunctionalUnit(name, cnt) for name, cnt in fu_config.items()}
+        # opcode -> unit class, execute and write result cycles
+        self.fu_of = [
+            None if unit == ISA.NONE else self.FUs.get(ISA.units[unit]) for unit in ISA.unit
+        ]
+        self.ex_cycles = [timing[name]["EX"] for name in ISA.names]
+        # the result is written at least one cycle after execution ends
+        self.wb_cycles = [max(timing[name]["WB"], 1) for name in ISA.names]
         self.clock = 0
         self.issue_ptr = 0
-        self.waiting = list(instructions)
-        self.in_flight = []
+        # stage-entry cycles, one row per instruction
+        self.timeline = Timeline(["ISS", "RO", "EX", "WB"], self.label)
+        self.timeline.add(len(instructions))
+        self.iss, self.ro, self.ex, self.wb = self.timeline.columns
+        for iid, inst in enumerate(instructions):
+            inst.iid = iid
+        # Instructions enter the issue window in program order. An instruction
+        # may only issue once no older windowed instruction names any of its
+        # registers, tracked by `pending` against the per-register queues of
+        # windowed instructions in `users`. Those with no pending registers
+        # wait in the `ready` list of their FU class, in program order.
+        self.window = window  # entries, None for the whole program
+        self.waiting = deque(instructions)
+        self.windowed = 0
+        self.users = defaultdict(deque)
+        self.readers = Counter()  # src1 of in-flight instructions
+        self.halts = 0  # halts in the window
+        # Issued instructions move through read operands, execute and write
+        # result, queued by the cycle they may take the next step:
+        # (cycle, instr) in issue order for `reading` and `executing`, a heap
+        # of (cycle, issue cycle, instr) for `writing`.
+        self.in_flight = set()
+        self.reading = deque()
+        self.executing = []
+        self.writing = []
+        self.fill_window()
 
-    def print_r_status(self):
+    def render_r_status(self):
         header = ""
-        print("Register Result Status")
         for key in self.RS:
             header += f"{key:<15}"
-        print(header)
-        print("-" * len(header))
-        for value in self.RS.values():
-            print(f"{str(value):<15}", end="")
-    
-    def print_status(self, fu):
-        for unit in fu.units:
+        values = "".join(f"{str(value):<15}" for value in self.RS.values())
+        return f"Register Result Status\n{header}\n{'-' * len(header)}\n{values}"
+
+    def print_r_status(self):
+        print(self.render_r_status(), end="")
+
+    def render_status(self, fu):
+        lines = []
+        for unit in range(fu.count):
+            instr = fu.instr[unit]
             instr_label = ""
-            if unit["instr"] is not None:
+            if instr is not None:
                 instr_label = (
-                    f"{unit['instr'].op} {unit['instr'].dest}:{unit['instr'].src1},{unit['instr'].src2}"
-                    if unit["instr"].src1 or unit["instr"].src2
-                    else f"{unit['instr'].op} {unit['instr'].dest}"
+                    f"{instr.op} {instr.dest}:{instr.src1},{instr.src2}"
+                    if instr.src1 or instr.src2
+                    else f"{instr.op} {instr.dest}"
                 )
-            print(
-                f"{fu.name:<18}{unit['busy']:<6}{unit['op'] or '':<6}{instr_label:<6}"
+            lines.append(
+                f"{fu.name:<18}{fu.is_busy(unit):<6}{fu.op[unit] or '':<6}{instr_label:<6}\n"
             )
+        return "".join(lines)
+
+    def print_status(self, fu):
+        print(self.render_status(fu), end="")
+
+    def render_cycle(self):
+        header = f"{'Name':<18}{'Busy':<6}{'Op':<6}{'Instr':<6}"
+        return (
+            self.render_r_status()
+            + f"\n\n\nFunction Unit Status\n{header}\n{'-' * len(header)}\n"
+            + "".join(self.render_status(fu) for fu in self.FUs.values())
+        )
+
+    def label(self, iid):
+        i = self.instructions[iid]
+        return f"{i.op} {i.dest}:{i.src1},{i.src2}" if i.src1 or i.src2 else f"{i.op} {i.dest}"
+
+    def render_summary(self):
+        return f"Final at cycle {self.clock}\n\n{self.timeline.render_table()}\n"
+
+    def counters(self):
+        return {"cycles": self.clock, "instructions": len(self.instructions)}
+
+    def snapshot(self):
+        units = {}
+        for name, fu in self.FUs.items():
+            units[name] = [
+                {
+                    "busy": fu.is_busy(unit),
+                    "reserved": fu.is_reserved(unit),
+                    "instr": None if fu.instr[unit] is None else str(fu.instr[unit]),
+                    "remaining": fu.remaining[unit],
+                }
+                for unit in range(fu.count)
+            ]
+        return {
+            "clock": self.clock,
+            "registers": {k: None if v is None else str(v) for k, v in self.RS.items()},
+            "units": units,
+        }
 
     def step(self):
         self.clock += 1
-        
-        self.print_r_status()
-        header = f"{'Name':<18}{'Busy':<6}{'Op':<6}{'Instr':<6}"
-        print(f"\n\n\nFunction Unit Status\n{header}")
-        print("-" * len(header))
+
         for fu in self.FUs.values():
-            fu.step()
-            self.print_status(fu)
-
-        for instr in list(self.in_flight):
-            if (
-                "RO_ready" in instr.stage_cycles
-                and "EX" not in instr.stage_cycles
-                and self.clock >= instr.stage_cycles["RO_ready"]
-            ):
-                fu = self.FUs[ISA[instr.op]["fu"]]
-                fu.allocate(instr, self.clock, self.timing[instr.op]["EX"])
-            elif (
-                "ISS" in instr.stage_cycles
-                and "RO_ready" not in instr.stage_cycles
-                and self.clock >= instr.stage_cycles["ISS"]
-            ):
-                instr.stage_cycles["RO_ready"] = self.clock
-            elif (
-                "EX" in instr.stage_cycles
-                and self.clock <= instr.stage_cycles["EX"] + self.timing[instr.op]["EX"]
-            ):
-                instr.stage_cycles["WB_ready"] = self.clock
-            elif (
-                "WB_ready" in instr.stage_cycles
-                and self.clock
-                >= instr.stage_cycles["WB_ready"] + self.timing[instr.op]["WB"]
-            ):
-                if instr.dest and self.RS[instr.dest] == instr:
-                    self.RS[instr.dest] = None
-                self.in_flight.remove(instr)
-                fu_reserved = next(
-                    (
-                        f
-                        for f in self.FUs[ISA[instr.op]["fu"]].units
-                        if f["reserved"] and not f["busy"]
-                    ),
-                    None,
-                )
-                fu_reserved["reserved"] = False
+            if fu.executing:
+                fu.step()
+        self.tracer.cycle(self)
+
+        # Operand reads never interact, unit allocation and release do, so
+        # those happen in issue order.
+        clock = self.clock
+        reading = self.reading
+        while reading and reading[0][0] <= clock:
+            self.read_operands(reading.popleft()[1])
+        changes = []
+        executing = self.executing
+        if executing and executing[0][0] <= clock:
+            eligible = 1
+            while eligible < len(executing) and executing[eligible][0] <= clock:
+                eligible += 1
+            changes = [instr for _, instr in executing[:eligible]]
+            del executing[:eligible]
+        writing = self.writing
+        while writing and writing[0][0] <= clock:
+            changes.append(heapq.heappop(writing)[2])
+        if changes:
+            iss = self.iss
+            changes.sort(key=lambda instr: iss[instr.iid])
+            waiting_for_unit = []
+            for instr in changes:
+                if instr.phase == "EX":
+                    self.write_result(instr)
+                elif not self.execute(instr):
+                    waiting_for_unit.append((clock, instr))
+            executing[:0] = waiting_for_unit
 
-        waiting_clone = self.waiting[:]
-        dependencies = []
-        j = 0
-        for inst in waiting_clone:
-            if inst.op == "HLT" and len(waiting_clone) > 1:
+        issue = None
+        for fu in self.FUs.values():
+            ready = fu.ready
+            if not ready or not fu.unreserved:
                 continue
+            for iid, inst in ready:
+                if issue is not None and iid > issue[0]:
+                    break
+                if self.can_issue(inst):
+                    issue = iid, inst
+                    break
+        if issue is not None:
+            self.issue(issue[1])
+            self.fill_window()
 
-            noRAW = all(self.RS.get(r) is None for r in (inst.src1, inst.src2) if r)
-            noWAR = not any(
-                inst.dest == r.src1 or inst.dest == r.src1 for r in self.in_flight
-            )
-            noWAW = self.RS.get(inst.dest) is None
-            free_fu = next(
-                (f for f in self.FUs[ISA[inst.op]["fu"]].units if not f["reserved"]),
-                None,
-            )
-            no_dependency = not any(
-                r in [inst.src1, inst.src2, inst.dest] for r in dependencies
-            )
-            if noRAW and noWAR and noWAW and free_fu and no_dependency:
-                free_fu["reserved"] = True
-                inst.stage_cycles["ISS"] = self.clock
-                if inst.dest:
-                    self.RS[inst.dest] = inst
-                self.in_flight.append(inst)
-                self.waiting.pop(j)
-                break
-            else:
-                j += 1
-                dependencies.extend(
-                    [
-                        r
-                        for r in [
-                            inst.dest if inst.dest and not inst.dest.isdigit() else None,
-                            inst.src1 if inst.src1 and not inst.src1.isdigit() else None,
-                            inst.src2 if inst.src2 and not inst.src2.isdigit() else None,
-                        ]
-                        if r is not None
-                    ]
-                )
+    def read_operands(self, instr):
+        instr.phase = "RO"
+        self.ro[instr.iid] = self.clock
+        self.executing.append((self.clock + 1, instr))
 
-    def run(self):
-        while self.waiting or self.in_flight:
+    def execute(self, instr):
+        fu = self.fu_of[instr.opcode]
+        exec_cycles = self.ex_cycles[instr.opcode]
+        if not fu.allocate(instr, exec_cycles):
+            return False
+        instr.phase = "EX"
+        done = self.clock + exec_cycles
+        self.ex[instr.iid] = self.clock
+        self.wb[instr.iid] = done
+        retire = done + self.wb_cycles[instr.opcode]
+        heapq.heappush(self.writing, (retire, self.iss[instr.iid], instr))
+        return True
+
+    def write_result(self, instr):
+        instr.phase = "WB"
+        if instr.dest and self.RS[instr.dest] == instr:
+            self.RS[instr.dest] = None
+        self.in_flight.discard(instr)
+        self.readers[instr.src1] -= 1
+        self.fu_of[instr.opcode].release()
+
+    def fill_window(self):
+        users = self.users
+        while self.waiting and (self.window is None or self.windowed < self.window):
+            inst = self.waiting.popleft()
+            self.issue_ptr += 1
+            self.windowed += 1
+            self.halts += ISA.halt[inst.opcode]
+            for r in inst.registers:
+                if users[r]:
+                    inst.pending += 1
+                users[r].append(inst)
+            if not inst.pending:
+                bisect.insort(self.fu_of[inst.opcode].ready, (inst.iid, inst))
+
+    def can_issue(self, inst):
+        # HLT waits until only halts are left in the window; younger
+        # instructions outside it cannot enter before it leaves
+        if ISA.halt[inst.opcode] and self.windowed > self.halts:
+            return False
+        noRAW = all(self.RS.get(r) is None for r in (inst.src1, inst.src2) if r)
+        noWAR = not self.readers[inst.dest]
+        noWAW = self.RS.get(inst.dest) is None
+        return noRAW and noWAR and noWAW
+
+    def issue(self, inst):
+        fu = self.fu_of[inst.opcode]
+        ready = fu.ready
+        del ready[bisect.bisect_left(ready, (inst.iid,))]
+        fu.reserve()
+        self.iss[inst.iid] = self.clock
+        inst.phase = "ISS"
+        if inst.dest:
+            self.RS[inst.dest] = inst
+        self.in_flight.add(inst)
+        self.reading.append((self.clock + 1, inst))
+        self.readers[inst.src1] += 1
+        self.windowed -= 1
+        if ISA.halt[inst.opcode]:
+            self.halts -= 1
+        # younger instructions naming the same registers move up their queues
+        for r in inst.registers:
+            queue = self.users[r]
+            queue.popleft()
+            if queue:
+                head = queue[0]
+                head.pending -= 1
+                if not head.pending:
+                    bisect.insort(self.fu_of[head.opcode].ready, (head.iid, head))
+
+    def run(self, until=None):
+        while self.waiting or self.windowed or self.in_flight:
+            if until is not None and self.clock >= until:
+                return
             self.step()
-        print(f"Final at cycle {self.clock}\n")
-        header = f"{'Instr':<18}{'ISS':<6}{'RO':<6}{'EX':<6}{'WB':<6}"
-        print(header)
-        print("-" * len(header))
-        for i in self.instructions:
-            instr_label = (
-                f"{i.op} {i.dest}:{i.src1},{i.src2}"
-                if i.src1 or i.src2
-                else f"{i.op} {i.dest}"
-            )
-            print(
-                f"{instr_label:<18}{str(i.stage_cycles.get('ISS', '')):<6}{str(i.stage_cycles.get('RO_ready', '')):<6}{str(i.stage_cycles.get('EX', '')):<6}{str(i.stage_cycles.get('WB_ready', '')):<6}"
-            )
+        self.tracer.summary(self)
+
+    # timed in a profiled run, see profiler.py
+    PHASES = {
+        "step": step,
+        "issue": issue,
+        "can_issue": can_issue,
+        "fill_window": fill_window,
+        "read_operands": read_operands,
+        "execute": execute,
+        "write_result": write_result,
+        "unit.step": FunctionalUnit.step,
+    }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["tracer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tracer = NullTracer()
 
 
 if __name__ == "__main__":
-    TIMING = {op: {"ISS": 1, "RO": 1, "EX": 3, "WB": 1} for op in ISA}
-    FU_CONFIG = {"ALU": 2, "LS": 2, "BR": 1, "IO": 1, "CTRL": 1}
     instrs = [
         Instruction("LD", "R1", "0"),  # ACC ← M[0]
         Instruction("ST", None, "R1", "1"),  # M[1] ← ACC
@@ -246,5 +383,16 @@ if __name__ == "__main__":
         Instruction("NOT", "R1"),  # ACC ← ¬ACC
         Instruction("HLT", None),  # stop execution
     ]
-    sb = Scoreboard(instrs, TIMING, FU_CONFIG)
-    sb.run()
+    parser = argparse.ArgumentParser(description="Run the scoreboard simulator.")
+    parser.add_argument("--window", type=int, help="issue window entries")
+    parser.add_argument("program", nargs="?", help="trace file to run")
+    tracer.add_arguments(parser)
+    timeline.add_arguments(parser)
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+    if args.program:
+        instrs = tracefile.read_program(tracefile.load(args.program), Instruction)
+    with tracer.from_arguments(args) as trace:
+        sb = Scoreboard(instrs, TIMING, FU_CONFIG, tracer=trace, window=args.window)
+        profiler.run(args, sb)
+    timeline.report(args, sb.timeline)
@@ -0,0 +1,263 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import random
+import sys
+from functools import lru_cache
+
+import predictor
+import tracefile
+from results import ResultCache
+from assembler import InstructionTable
+from pipeline import Pipeline
+from scoreboard import main as scoreboard
+from tomasulo import main as tomasulo
+
+ENGINES = ["pipeline", "scoreboard", "tomasulo"]
+METRICS = ["cycles", "stalls", "forwards", "flushes", "mispredicts", "cost"]
+
+# Parameters understood by each engine:
+#
+#   pipeline    forwarding, branch_inst
+#               predictor     not-taken, taken, bimodal or gshare
+#               entries       predictor counters, history  gshare history bits
+#   scoreboard  fu.<unit>     functional units of a FU_CONFIG class
+#               latency.<op>  EX cycles of one opcode, `latency` for all
+#               window        issue window entries
+#   tomasulo    buffer.<station>  reservation station entries
+#               latency.<op>      EX cycles of one opcode, `latency` for all
+#               issue_width       instructions issued per cycle
+
+
+# Builders take the lines of a program or a tracefile.Trace. Jobs load
+# their trace through the compiled cache, so every worker maps the same
+# columns instead of parsing the text again. With a results.ResultCache a
+# job already run on the same trace, parameters and simulator version
+# returns its stored row without simulating.
+
+
+@lru_cache(maxsize=8)
+def read_trace(path):
+    with open(path) as trace:
+        return tuple(trace)
+
+
+@lru_cache(maxsize=8)
+def load_trace(path):
+    return tracefile.load(path)
+
+
+@lru_cache(maxsize=8)
+def trace_digest(path):
+    return tracefile.digest(path)
+
+
+def build_pipeline(source, params):
+    p = Pipeline()
+    if isinstance(source, tracefile.Trace):
+        p.instructions = InstructionTable.from_trace(source)
+    else:
+        p.assembler.assemble(source, p.instructions)
+    p.hazard.forwarding = bool(params.get("forwarding", p.hazard.forwarding))
+    p.branch_inst = bool(params.get("branch_inst", p.branch_inst))
+    if "predictor" in params:
+        p.predictor = predictor.create(
+            params["predictor"], params.get("entries", 1024), params.get("history", 8)
+        )
+    return p, int(p.hazard.forwarding)
+
+
+def build_scoreboard(source, params):
+    fu_config = dict(scoreboard.FU_CONFIG)
+    timing = {op: dict(stages) for op, stages in scoreboard.TIMING.items()}
+    window = None
+    for key, value in params.items():
+        kind, _, name = key.partition(".")
+        if key == "window":
+            window = value
+        elif kind == "fu":
+            fu_config[name] = value
+        elif kind == "latency":
+            for op in [name] if name else timing:
+                timing[op]["EX"] = value
+        else:
+            raise ValueError(f"unknown scoreboard parameter {key!r}")
+    sb = scoreboard.Scoreboard(
+        tracefile.read_program(source, scoreboard.Instruction), timing, fu_config, window=window
+    )
+    return sb, sum(fu_config.values())
+
+
+def build_tomasulo(source, params):
+    buffers = {}
+    latency = {}
+    issue_width = 1
+    for key, value in params.items():
+        kind, _, name = key.partition(".")
+        if key == "issue_width":
+            issue_width = value
+        elif kind == "buffer":
+            buffers[name] = value
+        elif kind == "latency":
+            for op in [name] if name else tomasulo.ISA.names:
+                latency[op] = value
+        else:
+            raise ValueError(f"unknown tomasulo parameter {key!r}")
+    tm = tomasulo.Tomasulo(
+        tracefile.read_program(source, tomasulo.Instruction),
+        buffers=buffers,
+        latency=latency,
+        issue_width=issue_width,
+    )
+    return tm, sum(r["buffer"] for r in tm.RESOURCE)
+
+
+BUILDERS = {
+    "pipeline": build_pipeline,
+    "scoreboard": build_scoreboard,
+    "tomasulo": build_tomasulo,
+}
+
+
+def timeline_of(simulator):
+    if isinstance(simulator, tomasulo.Tomasulo):
+        return simulator.inst_status.timeline
+    return simulator.timeline
+
+
+def simulate(job):
+    # a result row; with a ResultCache, repeated jobs are read from it
+    engine, trace, params, cache = job
+    if cache is not None:
+        key = cache.key(engine, trace_digest(trace), params)
+        result = cache.get(key)
+        if result is not None:
+            return {**params, **result["metrics"]}
+    simulator, cost = BUILDERS[engine](load_trace(trace), params)
+    simulator.run()
+    counters = simulator.counters()
+    metrics = {metric: counters[metric] for metric in METRICS if metric in counters}
+    metrics["cost"] = cost
+    if cache is not None:
+        cache.put(key, metrics, timeline_of(simulator) if cache.timelines else None)
+    return {**params, **metrics}
+
+
+def grid(space):
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def sample(space, count, seed=None):
+    rng = random.Random(seed)
+    configs = grid(space)
+    if count >= len(configs):
+        return configs
+    return rng.sample(configs, count)
+
+
+def sweep(engine, trace, configs, workers=None, cache=None):
+    jobs = [(engine, trace, params, cache) for params in configs]
+    with multiprocessing.Pool(workers) as pool:
+        return pool.map(simulate, jobs)
+
+
+def dominates(a, b, objectives):
+    return all(a[o] <= b[o] for o in objectives) and any(
+        a[o] < b[o] for o in objectives
+    )
+
+
+def pareto(rows, objectives=("cycles", "cost")):
+    return [
+        row
+        for row in rows
+        if not any(dominates(other, row, objectives) for other in rows)
+    ]
+
+
+def parse_value(text):
+    if text.lower() in ("true", "false"):
+        return text.lower() == "true"
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def parse_space(params):
+    space = {}
+    for param in params:
+        name, _, values = param.partition("=")
+        if not values:
+            raise ValueError(f"expected NAME=V1,V2,..., got {param!r}")
+        space[name] = [parse_value(v) for v in values.split(",")]
+    return space
+
+
+def print_table(rows, stream=sys.stdout):
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = [max(len(str(c)), *(len(str(r[c])) for r in rows)) + 2 for c in columns]
+    stream.write("".join(f"{c:<{w}}" for c, w in zip(columns, widths)) + "\n")
+    stream.write("-" * sum(widths) + "\n")
+    for row in rows:
+        stream.write("".join(f"{str(row[c]):<{w}}" for c, w in zip(columns, widths)) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep simulator configurations.")
+    parser.add_argument("engine", choices=ENGINES)
+    parser.add_argument("trace", help="program to simulate")
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        metavar="NAME=V1,V2",
+        help="values of one parameter, repeat for each swept parameter",
+    )
+    parser.add_argument("--sample", type=int, help="run a random subset of the grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="worker processes (default: all CPUs)")
+    parser.add_argument("--csv", help="write every result row to this file")
+    parser.add_argument(
+        "--objectives",
+        default="cycles,cost",
+        help="comma separated metrics to minimize for the Pareto front",
+    )
+    parser.add_argument("--cache", help="result cache directory (default: ~/.cache)")
+    parser.add_argument("--no-cache", action="store_true", help="simulate every job")
+    parser.add_argument(
+        "--cache-size", type=int, default=256, help="result cache limit in MiB"
+    )
+    parser.add_argument(
+        "--cache-timelines",
+        action="store_true",
+        help="also store the per-instruction timeline of every run",
+    )
+    args = parser.parse_args()
+
+    space = parse_space(args.param)
+    if args.sample:
+        configs = sample(space, args.sample, args.seed)
+    else:
+        configs = grid(space)
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache, args.cache_size << 20, args.cache_timelines)
+    rows = sweep(args.engine, args.trace, configs, args.workers, cache)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+    print_table(rows)
+    print("\nPareto front")
+    print_table(pareto(rows, args.objectives.split(",")))
+
+
+if __name__ == "__main__":
+    main()
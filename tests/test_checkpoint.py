@@ -0,0 +1,65 @@
+import pytest
+
+import checkpoint
+from benchmarks.workload import generate
+from sweep import BUILDERS, ENGINES, timeline_of
+from tracer import CounterTracer
+
+
+def build(engine, params=None):
+    program = generate(engine, 300, branch_density=0.1)
+    simulator, _ = BUILDERS[engine](program, params or {})
+    return simulator
+
+
+def result(simulator):
+    return simulator.counters(), list(timeline_of(simulator).rows())
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_restored_run_matches_straight_run(engine):
+    straight = build(engine)
+    straight.run()
+    cycles = straight.counters()["cycles"]
+    for prefix in (1, cycles // 3, cycles - 1):
+        simulator = build(engine)
+        simulator.run(until=prefix)
+        restored = checkpoint.loads(checkpoint.dumps(simulator))
+        assert restored.clock == prefix
+        restored.run()
+        assert result(restored) == result(straight)
+
+
+def test_predictor_state_survives(tmp_path):
+    params = {"predictor": "gshare", "forwarding": 1}
+    straight = build("pipeline", params)
+    straight.run()
+    simulator = build("pipeline", params)
+    simulator.run(until=straight.clock // 2)
+    path = tmp_path / "pipeline.ckpt"
+    assert checkpoint.save(simulator, path) == path.stat().st_size
+    restored = checkpoint.load(path)
+    restored.run()
+    assert result(restored) == result(straight)
+    assert restored.branch_stats.branches == straight.branch_stats.branches
+    assert restored.counters()["branches"] > 0
+
+
+def test_restore_attaches_tracer():
+    simulator = build("scoreboard")
+    simulator.run(until=10)
+    data = checkpoint.dumps(simulator)
+    assert checkpoint.loads(data).tracer.per_cycle is False
+    tracer = CounterTracer()
+    restored = checkpoint.loads(data, tracer)
+    restored.run()
+    assert tracer.counters == restored.counters()
+
+
+def test_rejects_other_data():
+    data = checkpoint.dumps(build("tomasulo"))
+    with pytest.raises(checkpoint.CheckpointError, match="not a simulator checkpoint"):
+        checkpoint.loads(b"PK" + data)
+    newer = checkpoint.MAGIC + bytes([checkpoint.VERSION + 1]) + data[8:]
+    with pytest.raises(checkpoint.CheckpointError, match="unsupported"):
+        checkpoint.loads(newer)
@@ -0,0 +1,69 @@
+import pytest
+
+from benchmarks.workload import generate
+from functional import core_for, fast_forward, sample
+from sweep import BUILDERS, ENGINES
+from tracer import CounterTracer
+
+BRANCHY = generate("pipeline", 6000, branch_density=0.05, seed=0)
+
+# the shared program format, with everything the plain rows lack
+FORMATTED = [
+    "; comment line",
+    ".clock ADD 2",
+    "START: LD R1 0 _",
+    "ADD R2 R1 R1 3  # trailing clocks",
+    "LOOP:",
+    "SUB R3 R2 R1",
+    "ST _ R3 1",
+]
+PLAIN = ["LD R1 0", "ADD R2 R1 R1", "SUB R3 R2 R1", "ST _ R3 1"]
+
+
+def test_core_follows_the_pipeline_branch_model():
+    # R1 == R2 == 0, so BNE would really fall through
+    lines = ["BNE R1 R2 L", "ADD R3 R3 R3", "L: ADD R4 R4 R4"]
+    pcs = []
+    core_for("pipeline", lines).run(trace=pcs)
+    # without a predictor the pipeline takes every branch
+    assert pcs == [0, 2]
+    pcs = []
+    core_for("pipeline", lines, {"branch_inst": False}).run(trace=pcs)
+    assert pcs == [0, 1, 2]
+
+
+def test_sampled_cycles_bound_the_full_run():
+    simulator, _ = BUILDERS["pipeline"](BRANCHY, {})
+    simulator.run()
+    cycles = simulator.counters()["cycles"]
+    result = sample("pipeline", BRANCHY, windows=5, workers=2)
+    assert abs(result["cycles"] - cycles) <= result["bound"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_run_until_stops_after_that_cycle(engine):
+    lines = generate(engine, 300, seed=1)
+    full, _ = BUILDERS[engine](lines, {})
+    full.run()
+    simulator, _ = BUILDERS[engine](lines, {})
+    simulator.tracer = CounterTracer()
+    simulator.run(until=50)
+    assert simulator.tracer.cycles == simulator.counters()["cycles"] == 50
+    simulator.run()
+    assert simulator.counters() == full.counters()
+
+
+@pytest.mark.parametrize("engine", ["scoreboard", "tomasulo"])
+def test_text_programs_use_the_shared_format(engine):
+    formatted, _ = BUILDERS[engine](FORMATTED, {})
+    plain, _ = BUILDERS[engine](PLAIN, {})
+    formatted.run()
+    plain.run()
+    assert formatted.counters() == plain.counters()
+
+    simulator, core = fast_forward(engine, FORMATTED, 2)
+    rest, _ = BUILDERS[engine](PLAIN[2:], {})
+    simulator.run()
+    rest.run()
+    assert core.pc == 2
+    assert simulator.counters() == rest.counters()
@@ -0,0 +1,204 @@
+import io
+
+import pytest
+
+from instruction import ISA, Instruction
+from pipeline import ExecuteStage, Pipeline, WritebackStage
+from tracer import TableTracer
+
+# The hazard programs of main.py plus back-to-back branches, with the
+# cycles and counters the original pipeline produced for them.
+PROGRAMS = {
+    "war": [("SUB R4 R1 R5", 1), ("ADD R1 R2 R3", 1)],
+    "raw": [("ADD R1 R2 R3", 1), ("SUB R4 R1 R5", 1)],
+    "control": [
+        ("BEQ R1 R2 LABEL", 1),
+        ("ADD R3 R4 R5", 1),
+        ("SUB R6 R7 R8", 1),
+        ("SUB R9 R10 R11", 1),
+        ("SUB R12 R13 R14", 1),
+        ("LABEL: MUL R9 R10 R11", 1),
+    ],
+    "structural": [("MUL R1 R2 R3", 2), ("MUL R4 R5 R6", 2)],
+    "waw": [("MUL R1 R2 R3", 3), ("ADD R1 R5 R6", 1)],
+    "branches": [
+        ("BNE R1 R2 L3", 1),
+        ("BNE R4 R0 L3", 1),
+        ("BNE R3 R2 L3", 1),
+        ("L3: MUL R1 R1 R3", 1),
+    ],
+}
+
+# (program, forwarding): (cycles, stalls, forwards, flushes)
+EXPECTED = {
+    ("war", False): (10, 3, 0, 0),
+    ("raw", False): (10, 3, 0, 0),
+    ("control", False): (9, 0, 0, 2),
+    ("structural", False): (9, 0, 1, 0),
+    ("waw", False): (9, 0, 1, 0),
+    ("branches", False): (10, 1, 0, 2),
+    ("war", True): (7, 0, 1, 0),
+    ("raw", True): (7, 0, 1, 0),
+    ("control", True): (9, 0, 0, 2),
+    ("structural", True): (9, 0, 1, 0),
+    ("waw", True): (9, 0, 1, 0),
+    ("branches", True): (9, 0, 1, 2),
+}
+
+
+def run(name, forwarding, fast_forward=True):
+    p = Pipeline(fast_forward=fast_forward)
+    p.hazard.forwarding = forwarding
+    for command, clocks in PROGRAMS[name]:
+        p.add_instruction(command, clocks)
+    p.run()
+    return p
+
+
+@pytest.mark.parametrize("name, forwarding", list(EXPECTED))
+def test_matches_original_pipeline(name, forwarding):
+    p = run(name, forwarding)
+    counters = p.counters()
+    assert (
+        counters["cycles"],
+        counters["stalls"],
+        counters["forwards"],
+        counters["flushes"],
+    ) == EXPECTED[name, forwarding]
+
+
+@pytest.mark.parametrize("name, forwarding", list(EXPECTED))
+def test_fast_forward_matches_cycle_by_cycle(name, forwarding):
+    assert run(name, forwarding).counters() == run(name, forwarding, False).counters()
+
+
+def issue(stage, *clocks):
+    insts = []
+    for k, clock in enumerate(clocks):
+        inst = Instruction(f"ADD R{k} R{k} R{k}", clock)
+        stage.append(inst)
+        insts.append(inst)
+    return insts
+
+
+def test_execute_stage_keeps_issue_order():
+    stage = ExecuteStage()
+    a, b, c = issue(stage, 3, 1, 2)
+    assert list(stage) == [a, b, c]
+    stage.remove(b)
+    assert list(stage) == [a, c]
+    assert len(stage) == 2
+
+
+def test_execute_stage_counts_ticks():
+    stage = ExecuteStage()
+    a, b = issue(stage, 3, 1)
+    assert stage.cycles_to_completion() == 1
+    stage.tick(2)
+    assert stage.execution_clock(a) == 1
+    assert stage.order(a) == 2
+    assert stage.cycles_to_completion() == 0
+    assert stage.pop_ready() is b
+    assert (b.execution_clock, b.order, b.ex_seq) == (-1, 2, None)
+    assert stage.pop_ready() is None
+    assert stage.cycles_to_completion() == 1
+
+
+def test_pop_ready_follows_issue_order():
+    stage = ExecuteStage()
+    a, b, c = issue(stage, 3, 2, 1)
+    stage.tick(3)
+    assert [stage.pop_ready() for _ in range(4)] == [a, b, c, None]
+    assert len(stage) == 0
+
+
+def test_pop_ready_skips_removed_instructions():
+    stage = ExecuteStage()
+    a, b = issue(stage, 1, 1)
+    stage.remove(a)
+    stage.tick()
+    assert stage.pop_ready() is b
+    assert stage.pop_ready() is None
+    # a re-issued instruction completes on its new clock
+    stage.append(a)
+    assert stage.pop_ready() is None
+    stage.tick(a.execution_clock)
+    assert stage.pop_ready() is a
+
+
+def test_writeback_retires_highest_order_in_arrival_order():
+    stage = WritebackStage()
+    insts = [Instruction(f"ADD R{k} R{k} R{k}") for k in range(4)]
+    for inst, order in zip(insts, (1, 3, 2, 3)):
+        inst.order = order
+    stage.extend(insts)
+    assert list(stage) == insts
+    assert repr(stage) == repr(insts)
+    assert stage.retire() == [insts[1], insts[3]]
+    assert list(stage) == [insts[0], insts[2]]
+    stage.append(insts[1])
+    assert stage.retire() == [insts[1]]
+    assert stage.retire() == [insts[2]]
+    assert stage.retire() == [insts[0]]
+    assert stage.retire() == []
+    assert not stage
+
+
+def test_unknown_mnemonic_runs_on_no_unit():
+    # an unknown mnemonic must not borrow the unit of the last opcode
+    def counters(last_unit):
+        p = Pipeline()
+        p.hazard.unit = p.hazard.unit[:-1] + [last_unit]
+        p.add_instruction("FOO R1 R2 R3", 2)
+        p.add_instruction("FOO R4 R5 R6", 2)
+        p.run()
+        return p.counters()
+
+    multiplier = ISA.units.index("multiplier")
+    assert counters(multiplier) == counters(ISA.NONE)
+
+
+def test_waw_stalls_keep_original_writeback_order():
+    # instructions held back in WB return in the order the original
+    # pipeline found them: earlier-stage writer first, then WB order
+    program = [
+        ("SUB R2 R2 R1", 4),
+        ("ADD R3 R2 R3", 1),
+        ("MUL R3 R2 R1", 4),
+        ("ADD R0 R2 R0", 2),
+        ("SUB R0 R1 R2", 3),
+        ("SUB R1 R1 R3", 4),
+        ("SUB R0 R1 R0", 3),
+        ("ADD R2 R2 R0", 4),
+    ]
+    stream = io.StringIO()
+    p = Pipeline(tracer=TableTracer(stream, flush_every=1), fast_forward=False)
+    p.hazard.forwarding = True
+    for command, clocks in program:
+        p.add_instruction(command, clocks)
+    p.run()
+    wb = [line for line in stream.getvalue().splitlines() if line.startswith("WB:")]
+    assert wb[9] == (
+        "WB: [ADD R3 R2 R3, ADD R3 R2 R3, MUL R3 R2 R1, ADD R0 R2 R0, "
+        "ADD R3 R2 R3, ADD R3 R2 R3]"
+    )
+    assert wb[10] == (
+        "WB: [ADD R3 R2 R3, ADD R3 R2 R3, ADD R0 R2 R0, ADD R3 R2 R3, "
+        "ADD R3 R2 R3, SUB R0 R1 R2, ADD R0 R2 R0]"
+    )
+
+
+def test_compare_modes_keeps_configuration(monkeypatch, capsys):
+    import main
+
+    p = Pipeline()
+    p.hazard.forwarding = True
+    for command, clocks in PROGRAMS["raw"]:
+        p.add_instruction(command, clocks)
+    monkeypatch.setattr(main, "p", p)
+    main.compare_modes()
+    lines = capsys.readouterr().out.splitlines()
+    counters = str(run("raw", True).counters())
+    assert lines[0].endswith(counters) and lines[1].endswith(counters)
+    assert lines[2] == "identical: True"
+    assert p.clock == 0
@@ -0,0 +1,96 @@
+import pytest
+
+import predictor
+from pipeline import Pipeline
+from predictor import BTB, BimodalPredictor, GSharePredictor
+
+# R1 counts to 4, so the BNE is taken three times and then falls through
+LOOP = ["L: ADD R1 R1 1", "SUB R2 R1 4", "BNE R2 R0 L", "ADD R3 R3 1"]
+
+# predictor: (cycles, flushes, branches, mispredicts)
+EXPECTED = {
+    "not-taken": (48, 3, 4, 3),
+    "taken": (46, 3, 4, 2),  # misses on the cold BTB and at the exit
+    "bimodal": (46, 3, 4, 2),  # learns the loop after its first miss
+    "gshare": (48, 3, 4, 3),  # each history picks an untrained counter
+}
+
+
+def run_loop(name):
+    p = Pipeline(predictor=predictor.create(name))
+    for command in LOOP:
+        p.add_instruction(command, 1)
+    p.run()
+    return p
+
+
+@pytest.mark.parametrize("name", list(EXPECTED))
+def test_loop_counters(name):
+    p = run_loop(name)
+    counters = p.counters()
+    assert (
+        counters["cycles"],
+        counters["flushes"],
+        counters["branches"],
+        counters["mispredicts"],
+    ) == EXPECTED[name]
+    # every resolution is recorded against the BNE at pc 2
+    assert p.branch_stats.branches[2][:2] == list(EXPECTED[name][2:])
+    # the oracle ran the program to its architectural end
+    assert p.oracle.registers == {"R1": 4, "R2": 0, "R3": 1}
+
+
+def test_accuracy_table():
+    table = run_loop("bimodal").branch_stats.render()
+    assert table.splitlines()[-1].split() == ["total", "4", "2", "50.0%", "3"]
+
+
+def test_bimodal_counters_saturate():
+    p = BimodalPredictor(4)
+    assert not p.predict(1)
+    p.update(1, True)
+    assert p.predict(1)
+    for _ in range(5):
+        p.update(1, True)
+    assert p.counters[1] == 3
+    p.update(1, False)
+    assert p.predict(1)
+    p.update(1, False)
+    assert not p.predict(1)
+    # pc 5 shares the counter of pc 1
+    assert p.index(5) == 1
+
+
+def test_bimodal_needs_power_of_two():
+    with pytest.raises(ValueError):
+        BimodalPredictor(12)
+
+
+def test_gshare_history():
+    p = GSharePredictor(16, history=2)
+    for taken in (True, False, True):
+        p.update(0, taken, p.history)
+    assert p.history == 0b01  # masked to the last two outcomes
+    assert p.index(3, p.history) == 2
+    # the update trains the counter of the history it was predicted with,
+    # not of the current one
+    p.update(8, True, history=0b10)
+    assert p.counters[8 ^ 0b10] == 2
+    assert p.counters[8 ^ 0b01] == 1
+    assert p.history == 0b11
+
+
+def test_btb_hits_and_misses():
+    btb = BTB(4)
+    assert btb.lookup(2) is None
+    btb.update(2, 9)
+    assert btb.lookup(2) == 9
+    # pc 6 maps to the same slot and evicts pc 2
+    btb.update(6, 1)
+    assert btb.lookup(2) is None
+    assert btb.lookup(6) == 1
+
+
+def test_unknown_predictor():
+    with pytest.raises(ValueError, match="unknown predictor"):
+        predictor.create("perceptron")
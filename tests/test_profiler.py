@@ -0,0 +1,92 @@
+import argparse
+import pstats
+
+import pytest
+
+import profiler
+from benchmarks.workload import generate
+from sweep import BUILDERS, ENGINES
+
+PHASES = {
+    "pipeline": [
+        "step",
+        "hazard.control",
+        "hazard.structural",
+        "hazard.raw",
+        "hazard.waw",
+        "hazard.war",
+        "move_instructions",
+        "insert_instruction",
+        "skip_quiet_cycles",
+    ],
+    "scoreboard": [
+        "step",
+        "issue",
+        "can_issue",
+        "fill_window",
+        "read_operands",
+        "execute",
+        "write_result",
+        "unit.step",
+    ],
+    "tomasulo": [
+        "issue",
+        "next_cycle",
+        "fu.accept",
+        "fu.step",
+        "mem.accept",
+        "mem.step",
+        "res.create",
+        "res.delete",
+        "inst.move",
+    ],
+}
+
+# phases called once per instruction of the program
+PER_INSTRUCTION = {
+    "pipeline": [],
+    "scoreboard": ["issue", "read_operands", "execute", "write_result"],
+    "tomasulo": ["res.create", "res.delete"],
+}
+
+
+def build(engine):
+    simulator, _ = BUILDERS[engine](generate(engine, 300, branch_density=0.1), {})
+    return simulator
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_phase_keys(engine):
+    profile = profiler.Profile(build(engine))
+    profile.run()
+    phases = profile.phases()
+    assert list(phases) == PHASES[engine]
+    assert all(calls > 0 and seconds >= 0 for calls, seconds in phases.values())
+    for phase in PER_INSTRUCTION[engine]:
+        assert phases[phase][0] == 300
+    lines = profile.render().splitlines()
+    assert [line.split()[0] for line in lines[1 : len(phases) + 1]] == PHASES[engine]
+    assert lines[-1].startswith("run: ")
+    assert f"for {profile.engine.counters()['cycles']} cycles" in lines[-1]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_profiled_run_matches_plain_run(engine):
+    plain = build(engine)
+    plain.run()
+    profiled = build(engine)
+    profiler.Profile(profiled).run()
+    assert profiled.counters() == plain.counters()
+
+
+def test_run_writes_dump(tmp_path, capsys):
+    parser = argparse.ArgumentParser()
+    profiler.add_arguments(parser)
+    path = tmp_path / "run.pstats"
+    profiler.run(parser.parse_args(["--profile", str(path)]), build("scoreboard"))
+    assert capsys.readouterr().out.startswith("Phase ")
+    assert pstats.Stats(str(path)).total_calls > 0
+    simulator = build("scoreboard")
+    profiler.run(parser.parse_args([]), simulator)
+    assert capsys.readouterr().out == ""
+    assert simulator.counters()["cycles"] > 0
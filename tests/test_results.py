@@ -0,0 +1,69 @@
+import os
+import pickle
+
+import sweep
+from benchmarks.workload import generate
+from results import ResultCache
+
+
+def test_repeated_jobs_come_from_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACE_CACHE", str(tmp_path / "traces"))
+    trace = tmp_path / "program.s"
+    trace.write_text("\n".join(generate("tomasulo", 300, seed=1)) + "\n")
+    cache = ResultCache(str(tmp_path / "results"))
+    jobs = [("tomasulo", str(trace), {"issue_width": width}, cache) for width in (1, 2)]
+    rows = [sweep.simulate(job) for job in jobs]
+    assert rows == [sweep.simulate(job[:3] + (None,)) for job in jobs]
+    assert len(cache.entries()) == 2
+
+    monkeypatch.setattr(sweep, "BUILDERS", {})  # a hit must not simulate
+    assert [sweep.simulate(job) for job in jobs] == rows
+
+
+def test_timelines_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACE_CACHE", str(tmp_path / "traces"))
+    trace = tmp_path / "program.s"
+    trace.write_text("\n".join(generate("scoreboard", 200, seed=2)) + "\n")
+    job = ("scoreboard", str(trace), {"window": 8})
+    plain = ResultCache(str(tmp_path / "results"))
+    row = sweep.simulate(job + (plain,))
+    key = plain.key("scoreboard", sweep.trace_digest(str(trace)), {"window": 8})
+    assert plain.get(key)["timeline"] is None
+
+    # an entry without a timeline is a miss for a cache that keeps them
+    cache = ResultCache(str(tmp_path / "results"), timelines=True)
+    assert cache.get(key) is None
+    assert sweep.simulate(job + (cache,)) == row
+    simulator, _ = sweep.BUILDERS["scoreboard"](sweep.load_trace(str(trace)), {"window": 8})
+    simulator.run()
+    stored = cache.get(key)["timeline"]
+    assert stored.stages == simulator.timeline.stages
+    assert list(stored.rows()) == list(simulator.timeline.rows())
+
+
+def test_key_covers_engine_trace_and_params():
+    cache = ResultCache("unused")
+    key = cache.key("tomasulo", "digest", {"issue_width": 1})
+    assert key == cache.key("tomasulo", "digest", {"issue_width": 1})
+    assert key != cache.key("tomasulo", "digest", {"issue_width": 2})
+    assert key != cache.key("tomasulo", "other", {"issue_width": 1})
+    assert key != cache.key("scoreboard", "digest", {"issue_width": 1})
+
+
+def test_eviction_is_bounded_and_scans_rarely(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path), max_bytes=8000)
+    scans = []
+    entries = cache.entries
+    monkeypatch.setattr(cache, "entries", lambda: scans.append(1) or entries())
+    for n in range(200):
+        cache.put(f"{n:032x}", {"cycles": n, "padding": os.urandom(64)})
+    assert sum(size for _, size, _ in entries()) <= 8000
+    assert len(scans) < 40
+    assert cache.get(f"{199:032x}")["metrics"]["cycles"] == 199
+    assert cache.get(f"{0:032x}") is None
+
+
+def test_workers_share_one_cache_per_directory(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    first = pickle.loads(pickle.dumps(cache))
+    assert pickle.loads(pickle.dumps(cache)) is first
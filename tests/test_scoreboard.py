@@ -0,0 +1,167 @@
+import pytest
+
+from scoreboard.main import FU_CONFIG, TIMING, FunctionalUnit, Instruction, Scoreboard
+
+HALT_FIRST = [("HLT", None), ("ADD", "R1", "R2", "R3"), ("SUB", "R4", "R5", "R6")]
+
+# (program, window): cycles and the ISS/RO/EX/WB cycles of every
+# instruction. Without a window they are the original scoreboard's tables.
+ALU_PRESSURE = [
+    ("ADD", "R1", "R2", "R3"),
+    ("SUB", "R4", "R2", "R3"),
+    ("AND", "R5", "R2", "R3"),
+    ("OR", "R6", "R2", "R3"),
+    ("LD", "R7", "0"),
+    ("LD", "R0", "1"),
+    ("ST", None, "R2", "2"),
+]
+HAZARDS = [
+    ("LD", "R1", "0"),
+    ("ADD", "R2", "R1", "R1"),  # RAW on R1
+    ("ST", None, "R2", "1"),  # RAW on R2
+    ("SUB", "R1", "R3", "R3"),  # WAW with the LD, WAR with the ADD
+    ("OUT", "R1"),
+    ("NOT", "R4"),
+]
+EXPECTED = {
+    ("alu", None): (
+        15,
+        [
+            [1, 2, 3, 6],
+            [2, 3, 4, 7],
+            [7, 8, 9, 12],
+            [8, 9, 10, 13],
+            [3, 4, 5, 8],
+            [4, 5, 6, 9],
+            [9, 10, 11, 14],
+        ],
+    ),
+    ("alu", 1): (
+        21,
+        [
+            [1, 2, 3, 6],
+            [2, 3, 4, 7],
+            [7, 8, 9, 12],
+            [8, 9, 10, 13],
+            [9, 10, 11, 14],
+            [10, 11, 12, 15],
+            [15, 16, 17, 20],
+        ],
+    ),
+    ("hazards", None): (
+        26,
+        [
+            [1, 2, 3, 6],
+            [7, 8, 9, 12],
+            [13, 14, 15, 18],
+            [14, 15, 16, 19],
+            [20, 21, 22, 25],
+            [2, 3, 4, 7],
+        ],
+    ),
+    ("hazards", 1): (
+        27,
+        [
+            [1, 2, 3, 6],
+            [7, 8, 9, 12],
+            [13, 14, 15, 18],
+            [14, 15, 16, 19],
+            [20, 21, 22, 25],
+            [21, 22, 23, 26],
+        ],
+    ),
+}
+PROGRAMS = {"alu": ALU_PRESSURE, "hazards": HAZARDS}
+
+
+def run(program, window=None, until=None):
+    sb = Scoreboard(
+        [Instruction(*fields) for fields in program], TIMING, FU_CONFIG, window=window
+    )
+    sb.run(until)
+    return sb
+
+
+@pytest.mark.parametrize("window", [None, 1, 2])
+def test_halt_waits_only_on_its_window(window):
+    sb = run(HALT_FIRST, window, until=500)
+    assert sb.counters()["cycles"] == 9
+    if window == 1:
+        # alone in the window, nothing younger can have entered yet
+        assert list(sb.iss) == [1, 2, 3]
+    else:
+        assert list(sb.iss) == [3, 1, 2]
+
+
+@pytest.mark.parametrize("window", [0, -1])
+def test_window_needs_an_entry(window):
+    with pytest.raises(ValueError):
+        run([("ADD", "R1", "R2", "R3")], window)
+
+
+def rows(sb):
+    return [list(row) for _, row in sb.timeline.rows()]
+
+
+@pytest.mark.parametrize("name, window", list(EXPECTED))
+def test_matches_original_scoreboard(name, window):
+    sb = run(PROGRAMS[name], window)
+    cycles, expected = EXPECTED[name, window]
+    assert rows(sb) == expected
+    assert sb.counters() == {"cycles": cycles, "instructions": len(expected)}
+
+
+@pytest.mark.parametrize("name", list(PROGRAMS))
+def test_window_of_the_whole_program(name):
+    program = PROGRAMS[name]
+    assert rows(run(program, len(program))) == EXPECTED[name, None][1]
+
+
+@pytest.mark.parametrize("until", [0, 1, 5, 13, 26, 40])
+def test_until_resumes(until):
+    sb = run(HAZARDS, until=until)
+    assert sb.clock == min(until, 26)
+    sb.run()
+    assert rows(sb) == EXPECTED["hazards", None][1]
+    assert sb.clock == 26
+
+
+def test_unit_allocation_takes_the_lowest_idle_unit():
+    fu = FunctionalUnit("ALU", 3)
+    a, b, c, d = (Instruction("ADD", f"R{k}", "R5", "R6") for k in range(4))
+    assert fu.allocate(a, 1) and fu.allocate(b, 3) and fu.allocate(c, 2)
+    assert not fu.allocate(d, 1)
+    assert fu.instr == [a, b, c]
+    assert fu.step() == [a]
+    assert fu.executing == {1, 2}
+    assert not fu.is_busy(0) and fu.is_busy(1)
+    assert fu.allocate(d, 5)
+    assert fu.instr == [d, b, c]
+    assert fu.step() == [c]
+    assert fu.step() == [b]
+    assert fu.executing == {0}
+    assert fu.remaining == [3, 0, 0]
+
+
+def test_unit_reservation():
+    fu = FunctionalUnit("LS", 2)
+    fu.reserve()
+    assert fu.is_reserved(0) and not fu.is_reserved(1)
+    fu.reserve()
+    assert fu.unreserved == 0
+    # release frees the first reserved unit that is not executing
+    fu.allocate(Instruction("LD", "R1", "0"), 2)
+    fu.release()
+    assert fu.is_reserved(0) and not fu.is_reserved(1)
+
+
+def test_wide_unit_class():
+    # sixteen branch units, the table of the original scoreboard
+    sb = Scoreboard(
+        [Instruction("BRZ", None, "0") for _ in range(20)],
+        TIMING,
+        {**FU_CONFIG, "BR": 16},
+    )
+    sb.run()
+    assert list(sb.iss) == list(range(1, 17)) + [19, 20, 25, 26]
+    assert sb.counters()["cycles"] == 32
@@ -0,0 +1,68 @@
+import tracemalloc
+
+import predictor
+from benchmarks.stream import program
+from pipeline import Pipeline
+
+
+def streamed(tmp_path, length, window=16, name=None):
+    p = Pipeline(window=window, predictor=name and predictor.create(name))
+    p.stream(program(length), str(tmp_path / f"{length}.trace"))
+    return p
+
+
+def in_memory(length, name=None):
+    p = Pipeline(predictor=name and predictor.create(name))
+    p.assembler.assemble(program(length), p.instructions)
+    p.run()
+    return p
+
+
+def run_peak(p):
+    tracemalloc.start()
+    p.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def test_window_bounds_the_timeline(tmp_path):
+    p = streamed(tmp_path, 600)
+    while p.clock < 1000 and (p.instruction_pointer < len(p.instructions) or any(p.pipeline)):
+        p.run(until=p.clock + 50)
+        assert len(list(p.timeline.rows())) < 2 * p.window
+        assert len(p.fetched) < 2 * p.window
+    assert len(p.timeline) == 600
+    assert p.counters() == in_memory(600).counters()
+
+
+def test_streamed_run_matches_in_memory_run(tmp_path):
+    p = streamed(tmp_path, 400, name="bimodal")
+    p.run()
+    q = in_memory(400, "bimodal")
+    assert p.counters() == q.counters()
+    assert list(p.timeline.rows()) == list(q.timeline.rows())[-len(p.fetched):]
+
+
+def test_run_memory_does_not_grow_with_length(tmp_path):
+    short, long = streamed(tmp_path, 500), streamed(tmp_path, 4000)
+    short_peak, long_peak = run_peak(short), run_peak(long)
+    assert long_peak < 2 * short_peak
+    # while the in-memory run keeps a row per instruction
+    p = Pipeline()
+    p.assembler.assemble(program(4000), p.instructions)
+    assert run_peak(p) > 4 * long_peak
+
+
+def test_window_keeps_instructions_in_flight():
+    # the MUL is still in EX when the ADDs behind it are fetched, so its
+    # row outlives the window
+    p = Pipeline(window=1)
+    p.add_instruction("MUL R1 R2 R3", 20)
+    for k in range(4, 9):
+        p.add_instruction(f"ADD R{k} R5 R6", 1)
+    p.run()
+    rows = list(p.timeline.rows())
+    assert rows[0] == (0, [1, 2, 3, 32, 33])
+    assert len(rows) == 6
+    assert p.counters()["cycles"] == 34
@@ -0,0 +1,111 @@
+import csv
+import sys
+
+import pytest
+
+from pipeline import Pipeline
+from timeline import Timeline, parse_range
+
+
+def raw_timeline():
+    p = Pipeline()
+    p.add_instruction("ADD R1 R2 R3", 1)
+    p.add_instruction("SUB R4 R1 R5", 1)
+    p.run()
+    return p.timeline
+
+
+def small_timeline():
+    labels = []
+
+    def label(iid):
+        labels.append(iid)
+        return f"OP {iid}"
+
+    timeline = Timeline(["ISS", "EX", "WB"], label)
+    assert timeline.add(4) == 0
+    for iid in range(4):
+        timeline.record(iid, "ISS", iid + 1)
+        timeline.record(iid, "EX", iid + 2)
+    timeline.record(0, "WB", 5)
+    return timeline, labels
+
+
+def test_records_and_rows():
+    timeline, labels = small_timeline()
+    assert len(timeline) == 4
+    assert timeline.get(0, "WB") == 5
+    assert timeline.get(1, "WB") is None
+    assert list(timeline.rows(1, 3)) == [(1, [2, 3, None]), (2, [3, 4, None])]
+    assert list(timeline.rows(-1)) == [(3, [4, 5, None])]
+    assert labels == []
+
+
+def test_released_rows_keep_their_ids():
+    timeline, _ = small_timeline()
+    timeline.release(2)
+    assert len(timeline) == 4
+    assert timeline.add() == 4
+    assert [iid for iid, _ in timeline.rows()] == [2, 3, 4]
+    assert timeline.get(3, "EX") == 5
+    assert list(timeline.rows(0, 3)) == [(2, [3, 4, None])]
+
+
+def test_table_renders_only_the_range():
+    timeline, labels = small_timeline()
+    assert timeline.render_table(1, 3).splitlines() == [
+        "Instr             ISS   EX    WB    ",
+        "------------------------------------",
+        "OP 1              2     3           ",
+        "OP 2              3     4           ",
+    ]
+    assert labels == [1, 2]
+
+
+def test_pipeline_diagram():
+    timeline = raw_timeline()
+    assert list(timeline.rows()) == [(0, [1, 2, 3, 4, 5]), (1, [2, 3, 7, 8, 9])]
+    assert timeline.render_diagram().splitlines() == [
+        "Instr             1   2   3   4   5   6   7   8   9   ",
+        "ADD R1 R2 R3      IF  ID  EX  MEM WB",
+        "SUB R4 R1 R5          IF  ID  -   -   -   EX  MEM WB",
+    ]
+    assert timeline.render_diagram(1).splitlines()[0].startswith("Instr             2 ")
+
+
+def test_csv_export(tmp_path):
+    timeline, _ = small_timeline()
+    path = str(tmp_path / "timeline.csv")
+    timeline.save(path)
+    with open(path, newline="") as source:
+        rows = list(csv.reader(source))
+    assert rows[0] == ["id", "instr", "ISS", "EX", "WB"]
+    assert rows[1] == ["0", "OP 0", "1", "2", "5"]
+    assert rows[2] == ["1", "OP 1", "2", "3", ""]
+    assert len(rows) == 5
+    timeline.to_csv(path, 2, 3)
+    with open(path, newline="") as source:
+        assert list(csv.reader(source))[1:] == [["2", "OP 2", "3", "4", ""]]
+
+
+def test_npz_export(tmp_path):
+    numpy = pytest.importorskip("numpy")
+    timeline = raw_timeline()
+    path = str(tmp_path / "timeline.npz")
+    timeline.save(path)
+    data = numpy.load(path)
+    assert sorted(data.files) == sorted(timeline.stages)
+    assert list(data["EX"]) == [3, 7]
+
+
+def test_npz_needs_numpy(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    with pytest.raises(ImportError, match="needs numpy"):
+        raw_timeline().save(str(tmp_path / "timeline.npz"))
+
+
+@pytest.mark.parametrize(
+    "text, expected", [("2:5", (2, 5)), (":5", (0, 5)), ("2:", (2, None)), ("-3:", (-3, None))]
+)
+def test_parse_range(text, expected):
+    assert parse_range(text) == expected
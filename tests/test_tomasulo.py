@@ -0,0 +1,241 @@
+import pytest
+
+from tomasulo.main import ISA, Instruction, ResStatus, Tomasulo
+from tracer import CounterTracer
+
+# Programs with the issue/EX/memAccess/CDN cycles of every instruction.
+# Where the original simulator ran them to the end its tables match these.
+DEFAULT = [
+    ("LD", "R1", "0"),
+    ("ST", None, "R1", "1"),
+    ("ADD", "R1", "R1", "R2"),
+    ("SUB", "R1", "R1", "R2"),
+    ("ST", None, "R1", "2"),
+    ("AND", "R1", "R1", "R2"),
+    ("XOR", "R1", "R1", "R2"),
+]
+DEFAULT_ROWS = [
+    [1, 2, 3, 4],
+    [2, 5, 6, None],
+    [3, 5, None, 6],
+    [4, 7, None, 8],
+    [5, 9, 10, None],
+    [6, 9, None, 10],
+    [7, 11, None, 12],
+]
+
+
+def run(program, until=None, **options):
+    tm = Tomasulo([Instruction(*fields) for fields in program], **options)
+    tm.run(until)
+    return tm
+
+
+def rows(tm):
+    return [row for _, row in tm.inst_status.timeline.rows()]
+
+
+def test_default_program():
+    tm = run(DEFAULT)
+    assert rows(tm) == DEFAULT_ROWS
+    assert tm.counters() == {"cycles": 13, "instructions": 7}
+
+
+def test_reset_runs_again():
+    tm = run(DEFAULT)
+    tm.reset()
+    assert tm.clock == 0
+    assert all(row == [None] * 4 for row in rows(tm))
+    tm.run()
+    assert rows(tm) == DEFAULT_ROWS
+    assert tm.counters() == {"cycles": 13, "instructions": 7}
+
+
+def test_reset_to_another_program():
+    tm = run(DEFAULT)
+    tm.reset([Instruction("ADD", "R1", "R2", "R3")])
+    tm.run()
+    assert rows(tm) == [[1, 2, None, 3]]
+    assert tm.counters() == {"cycles": 4, "instructions": 1}
+
+
+def test_instances_share_no_state():
+    first = run(DEFAULT, until=4)
+    second = run(DEFAULT)
+    first.run()
+    assert rows(first) == rows(second) == DEFAULT_ROWS
+    assert first.res_status is not second.res_status
+    assert first.reg_status.Qi is not second.reg_status.Qi
+
+
+def test_completions_are_drained_once():
+    tm = Tomasulo([Instruction(*fields) for fields in DEFAULT])
+    status = tm.inst_status
+    add = tm.program[2]
+    # ADD goes through issue, EX and CDN
+    assert [status.move_inst(add, clock) for clock in (1, 2, 3)] == [False, False, True]
+    assert status.move_inst(add, 4) is False
+    assert status.finished_insts() == [add]
+    assert status.finished_insts() == []
+    assert rows(tm)[2] == [1, 2, None, 3]
+
+
+def test_full_stations_hold_issue_until_one_frees():
+    # the three adder stations are taken until the first ADD writes back at
+    # 6, so the last ADD issues at 7 and the ST behind it at 8
+    tm = run(
+        [
+            ("LD", "R1", "0"),
+            ("ADD", "R2", "R1", "R1"),
+            ("ADD", "R3", "R2", "R2"),
+            ("SUB", "R4", "R3", "R3"),
+            ("ADD", "R5", "R1", "R1"),
+            ("ST", None, "R5", "1"),
+        ]
+    )
+    assert rows(tm) == [
+        [1, 2, 3, 4],
+        [2, 5, None, 6],
+        [3, 7, None, 8],
+        [4, 9, None, 10],
+        [7, 8, None, 9],
+        [8, 10, 11, None],
+    ]
+    assert tm.counters()["cycles"] == 12
+
+
+def test_broadcast_wakes_only_dependents():
+    res = ResStatus(Tomasulo.RESOURCE)
+    program = [
+        Instruction("LD", "R1", "0"),
+        Instruction("ADD", "R2", "R1", "R1"),
+        Instruction("SUB", "R3", "R1", "R2"),
+        Instruction("AND", "R5", "R4", "R4"),
+    ]
+    names = ["load", "adder", "adder", "general"]
+    for iid, (inst, name) in enumerate(zip(program, names)):
+        inst.iid = iid
+        res.create(inst, name)
+    ld, add, sub, and_ = program
+    assert [res.is_ready(inst) for inst in program] == [True, False, False, True]
+    station = res.station_of[sub.iid]
+    assert (station.Qj, station.Qk) == ("adder1", "load1")
+    # SUB still waits for the ADD after the load's broadcast
+    assert res.delete(res.get_inst_id(ld)) == [add]
+    assert not res.is_ready(sub)
+    assert res.delete(res.get_inst_id(add)) == [sub]
+    assert res.delete(res.get_inst_id(sub)) == []
+    assert res.is_ready(and_)
+    assert not res.waiting
+    assert res.has_free("load") and res.get_inst_id(ld) is None
+
+
+def test_broadcast_fan_out():
+    tm = run(
+        [
+            ("LD", "R1", "0"),
+            ("ADD", "R2", "R1", "R1"),
+            ("SUB", "R3", "R1", "R2"),
+            ("XOR", "R4", "R3", "R1"),
+            ("AND", "R5", "R1", "R1"),
+            ("ST", None, "R4", "1"),
+        ]
+    )
+    assert rows(tm) == [
+        [1, 2, 3, 4],
+        [2, 5, None, 6],
+        [3, 7, None, 8],
+        [4, 9, None, 10],
+        [5, 6, None, 7],
+        [6, 11, 12, None],
+    ]
+    assert tm.counters()["cycles"] == 13
+
+
+LONG_MUL = [("MUL", "R1", "R2", "R3"), ("ADD", "R4", "R1", "R1"), ("AND", "R5", "R2", "R2")]
+
+
+class EveryCycle(CounterTracer):
+    per_cycle = True
+
+
+def test_skipped_cycles_match_every_cycle():
+    skipping, every = CounterTracer(), EveryCycle()
+    fast = run(LONG_MUL, latency={"MUL": 20}, tracer=skipping)
+    slow = run(LONG_MUL, latency={"MUL": 20}, tracer=every)
+    assert rows(fast) == rows(slow) == [[1, 2, None, 22], [2, 23, None, 24], [3, 4, None, 5]]
+    assert fast.counters() == slow.counters() == {"cycles": 25, "instructions": 3}
+    assert skipping.cycles == every.cycles == 25
+
+
+@pytest.mark.parametrize("until", range(15))
+def test_until_resumes(until):
+    tm = run(DEFAULT, until)
+    assert tm.clock == min(until, 13)
+    tm.run()
+    assert rows(tm) == DEFAULT_ROWS
+    assert tm.counters()["cycles"] == 13
+
+
+def test_latency_gap_does_not_end_the_run():
+    # the original loop stopped at the first cycle without progress, here
+    # cycle 7, and never issued the last AND
+    tm = run(
+        [
+            ("ADD", "R4", "R2", "R1"),
+            ("OR", "R4", "R4", "R4"),
+            ("AND", "R2", "R2", "R3"),
+            ("AND", "R4", "R3", "R3"),
+            ("AND", "R3", "R3", "R4"),
+        ]
+    )
+    assert rows(tm) == [
+        [1, 2, None, 3],
+        [2, 4, None, 5],
+        [3, 4, None, 5],
+        [4, 5, None, 6],
+        [6, 7, None, 8],
+    ]
+    assert tm.counters()["cycles"] == 9
+
+
+def test_issue_width():
+    tm = run(DEFAULT, issue_width=2)
+    assert rows(tm) == [
+        [1, 2, 3, 4],
+        [1, 5, 6, None],
+        [2, 5, None, 6],
+        [2, 7, None, 8],
+        [3, 9, 10, None],
+        [3, 9, None, 10],
+        [4, 9, None, 10],
+    ]
+    assert tm.counters()["cycles"] == 11
+
+
+def test_wide_issue_stays_in_order():
+    # the fourth ADD finds the three adder stations taken, and the AND
+    # behind it waits although a general station is free
+    program = [("ADD", f"R{k}", "R8", "R9") for k in range(4)]
+    program.append(("AND", "R7", "R8", "R9"))
+    tm = run(program, issue_width=8)
+    assert [row[0] for row in rows(tm)] == [1, 1, 1, 4, 4]
+    assert tm.counters()["cycles"] == 7
+
+
+def test_issue_routes_by_opcode():
+    tm = Tomasulo([])
+    fus = {fu.name: fu for fu in tm.fus}
+    for opcode, unit in enumerate(ISA.unit):
+        route = tm.issue_unit.route[opcode]
+        if unit == ISA.NONE:
+            assert route is None
+        elif ISA.unit_config[ISA.units[unit]].get("memory"):
+            assert route is tm.mem_unit
+        else:
+            assert route is fus[ISA.units[unit]]
+
+
+def test_unknown_opcode():
+    with pytest.raises(ValueError, match="unknown opcode"):
+        Instruction("NOP", "R1")
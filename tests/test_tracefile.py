@@ -0,0 +1,126 @@
+import json
+import pickle
+
+import pytest
+
+import assembler
+import isa
+import tracefile
+from assembler import InstructionTable
+from pipeline import Pipeline
+
+PROGRAM = ["MUL R1 R2 R3", "L: ADD R4 R1 R5", "BNE R4 R0 L"]
+
+
+def write(tmp_path, lines):
+    path = tmp_path / "program.s"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_load_matches_parse(tmp_path):
+    path = write(tmp_path, PROGRAM)
+    for _ in range(2):  # compiled, then mapped from the cache
+        loaded = tracefile.load(path, str(tmp_path / "cache"))
+        parsed = tracefile.parse(PROGRAM)
+        for name in tracefile.COLUMNS:
+            assert list(getattr(loaded, name)) == list(getattr(parsed, name))
+    assert list(loaded.targets) == [tracefile.NONE, tracefile.NONE, 1]
+
+
+def test_clocks_are_part_of_the_cache_key(tmp_path):
+    path = write(tmp_path, PROGRAM)
+    cache = str(tmp_path / "cache")
+    assert list(tracefile.load(path, cache).latencies) == [1, 1, 1]
+    assert list(tracefile.load(path, cache, {"MUL": 5}).latencies) == [5, 1, 1]
+    assert list(tracefile.load(path, cache).latencies) == [1, 1, 1]
+
+
+def test_isa_change_invalidates_the_cache(tmp_path, monkeypatch):
+    path = write(tmp_path, PROGRAM)
+    cache = str(tmp_path / "cache")
+    assert list(tracefile.load(path, cache).latencies) == [1, 1, 1]
+
+    # what a new process sees after giving MUL a latency in isa.json
+    with open(isa.PATH) as source:
+        spec = json.load(source)
+    spec["pipeline"]["ops"]["MUL"]["latency"] = 5
+    spec_path = tmp_path / "isa.json"
+    spec_path.write_text(json.dumps(spec))
+    edited = isa.load(str(spec_path))["pipeline"]
+    monkeypatch.setattr(isa, "PATH", str(spec_path))
+    monkeypatch.setattr(
+        assembler,
+        "CLOCKS",
+        {name: clock for name, clock in zip(edited.names, edited.latency) if clock is not None},
+    )
+
+    assert list(tracefile.load(path, cache).latencies) == [5, 1, 1]
+    assert list(assembler.assemble(PROGRAM).execution_clocks) == [5, 1, 1]
+
+
+def test_appending_to_a_loaded_program(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACE_CACHE", str(tmp_path / "cache"))
+    path = write(tmp_path, PROGRAM[:2])
+    loaded = Pipeline()
+    loaded.load(path)
+    loaded.add_instruction("SUB R6 R4 R1")
+    text = Pipeline()
+    for command in PROGRAM[:2] + ["SUB R6 R4 R1"]:
+        text.add_instruction(command)
+    loaded.run()
+    text.run()
+    assert loaded.counters() == text.counters()
+    assert [repr(inst) for inst in loaded.instructions] == [
+        repr(inst) for inst in text.instructions
+    ]
+
+
+def test_extending_a_parsed_program():
+    parsed = tracefile.parse(PROGRAM)
+    table = InstructionTable.from_trace(parsed)
+    assert table.label_index["L"] == 1
+    table.append("BEQ", "R1", "R2", "L")
+    table.link()
+    assert list(table.targets) == [tracefile.NONE, tracefile.NONE, 1, 1]
+    # the trace keeps its own columns
+    assert len(parsed.ops) == 3
+
+    p = Pipeline()
+    p.instructions = InstructionTable.from_trace(tracefile.parse(PROGRAM))
+    p.add_instruction("M: SUB R6 R4 R1")
+    p.add_instruction("BNE R6 R0 M")
+    p.instructions.link()
+    assert p.instructions.labels == {1: "L", 3: "M"}
+    assert list(p.instructions.targets)[-1] == 3
+
+
+def test_pickled_program_from_a_trace(tmp_path):
+    table = InstructionTable.from_trace(tracefile.load(write(tmp_path, PROGRAM), str(tmp_path)))
+    copy = pickle.loads(pickle.dumps(table))
+    assert copy.label_index == {"L": 1}
+    assert [repr(inst) for inst in copy] == [repr(inst) for inst in table]
+
+
+def test_assembler_and_compiler_read_one_format():
+    lines = [
+        "; comment",
+        ".clock MUL 4",
+        "TOP:",
+        "MUL R1 R2 R3  # default clocks",
+        "ADD R4 R1 _ 2",
+        "NO_OP",
+        "BNE R4 R0 TOP",
+    ]
+    table = assembler.assemble(lines)
+    parsed = tracefile.parse(lines)
+    assert list(table.ops) == list(parsed.ops)
+    assert list(table.operands1) == list(parsed.dests)
+    assert list(table.operands3) == list(parsed.sources2)
+    assert list(table.execution_clocks) == list(parsed.latencies) == [4, 2, 1, 1]
+    assert list(table.targets) == list(parsed.targets)
+    assert table.labels == dict(parsed.label_map().items()) == {0: "TOP"}
+    for bad in (["ADD R1 R2 R3 R4 R5 R6"], ["A: ADD R1 R1 R1"] * 2, ["X:"]):
+        for read in (assembler.assemble, tracefile.parse):
+            with pytest.raises(assembler.AssemblerError):
+                read(bad)
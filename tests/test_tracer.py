@@ -0,0 +1,114 @@
+import io
+import json
+
+import pytest
+
+from pipeline import Pipeline
+from scoreboard.main import FU_CONFIG, TIMING, Scoreboard
+from scoreboard.main import Instruction as ScoreboardInstruction
+from tracer import CounterTracer, JSONLinesTracer, NullTracer, TableTracer, make_tracer
+
+RAW = [("ADD R1 R2 R3", 1), ("SUB R4 R1 R5", 1)]
+
+# IF, ID, EX, MEM and WB of every cycle of RAW, as the original pipeline
+# printed them
+RAW_CYCLES = [
+    ("ADD R1 R2 R3", None, None, None, None),
+    ("SUB R4 R1 R5", "ADD R1 R2 R3", None, None, None),
+    (None, "SUB R4 R1 R5", "[ADD R1 R2 R3]", None, None),
+    (None, "SUB R4 R1 R5", None, "ADD R1 R2 R3", None),
+    (None, "SUB R4 R1 R5", None, None, "[ADD R1 R2 R3]"),
+    (None, "SUB R4 R1 R5", None, None, None),
+    (None, None, "[SUB R4 R1 R5]", None, None),
+    (None, None, None, "SUB R4 R1 R5", None),
+    (None, None, None, None, "[SUB R4 R1 R5]"),
+    (None, None, None, None, None),
+]
+
+
+def printed(cycles, stall, forward):
+    # the original Pipeline.step / print_pipeline / run output
+    lines = []
+    for clock, stages in enumerate(cycles, 1):
+        lines.append(f"\nClock Cycle {clock}:")
+        for name, instr in zip(["IF", "ID", "EX", "MEM", "WB"], stages):
+            lines.append(f"{name}: {instr or 'Empty'}")
+    lines.append(f"\nStall Numbers: {stall}")
+    lines.append(f"Forward Numbers: {forward}")
+    lines.append(f"Cycles: {len(cycles)}")
+    return "\n".join(lines) + "\n"
+
+
+def pipeline(tracer):
+    p = Pipeline(tracer=tracer)
+    for command, clocks in RAW:
+        p.add_instruction(command, clocks)
+    return p
+
+
+def test_table_matches_original_pipeline_output():
+    stream = io.StringIO()
+    pipeline(TableTracer(stream, flush_every=3)).run()
+    assert stream.getvalue() == printed(RAW_CYCLES, 3, 0)
+
+
+def test_table_matches_original_scoreboard_output():
+    stream = io.StringIO()
+    program = [("LD", "R1", "0"), ("ADD", "R2", "R1", "R1")]
+    sb = Scoreboard(
+        [ScoreboardInstruction(*fields) for fields in program],
+        TIMING,
+        FU_CONFIG,
+        tracer=TableTracer(stream),
+    )
+    sb.run()
+    out = stream.getvalue()
+    # the register and unit status of every cycle, then the final table
+    assert out.count("Register Result Status\n") == 13
+    assert out.endswith(
+        "Final at cycle 13\n\n"
+        f"{'Instr':<18}{'ISS':<6}{'RO':<6}{'EX':<6}{'WB':<6}\n"
+        f"{'-' * 42}\n"
+        f"{'LD R1:0,None':<18}{'1':<6}{'2':<6}{'3':<6}{'6':<6}\n"
+        f"{'ADD R2:R1,R1':<18}{'7':<6}{'8':<6}{'9':<6}{'12':<6}\n"
+    )
+
+
+def test_null_tracer_formats_nothing(monkeypatch):
+    def fail(self):
+        raise AssertionError("formatted a cycle")
+
+    monkeypatch.setattr(Pipeline, "render_cycle", fail)
+    monkeypatch.setattr(Pipeline, "render_summary", fail)
+    p = pipeline(NullTracer())
+    p.run()
+    assert p.counters()["cycles"] == 10
+
+
+def test_counter_tracer_counts_skipped_cycles():
+    stream = io.StringIO()
+    tracer = CounterTracer(stream)
+    p = Pipeline(tracer=tracer)
+    p.add_instruction("MUL R1 R2 R3", 20)
+    p.run()
+    assert tracer.cycles == p.counters()["cycles"]
+    assert tracer.counters == p.counters()
+    assert stream.getvalue().splitlines()[0] == f"cycles: {p.clock}"
+
+
+def test_jsonl_has_a_snapshot_per_cycle(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    with JSONLinesTracer(path, flush_every=4) as tracer:
+        pipeline(tracer).run()
+    *records, summary = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["clock"] for record in records] == list(range(1, 11))
+    assert records[2]["stages"]["EX"] == ["ADD R1 R2 R3"]
+    assert summary["summary"] == {"cycles": 10, "stalls": 3, "forwards": 0, "flushes": 0}
+
+
+def test_make_tracer():
+    assert isinstance(make_tracer("null"), NullTracer)
+    with pytest.raises(ValueError):
+        make_tracer("jsonl")
+    with pytest.raises(ValueError):
+        make_tracer("xml")
@@ -0,0 +1,157 @@
+import csv
+from array import array
+
+# Per-instruction stage-entry cycles shared by the three engines. Every
+# stage is one integer column indexed by instruction id, holding the cycle
+# the instruction entered that stage or NONE if it never did. Hot loops
+# write straight into `column(stage)`.
+#
+# Nothing is formatted while recording. `label` turns an instruction id
+# into its text and is only called for the rows that are rendered or
+# exported.
+#
+# `release` drops the oldest rows for runs that only keep a recent window.
+# Ids keep counting, so row `iid - first` of a column holds instruction
+# `iid`; `first` stays 0 unless rows were released.
+
+
+class Timeline:
+    NONE = -1
+
+    def __init__(self, stages, label=None):
+        self.stages = list(stages)
+        self.columns = [array("i") for _ in self.stages]
+        self.label = str if label is None else label
+        self.first = 0  # id of the oldest row held
+
+    def __len__(self):
+        return self.first + len(self.columns[0])
+
+    def column(self, stage):
+        return self.columns[self.stages.index(stage)]
+
+    def add(self, count=1):
+        # appends `count` instructions that entered no stage yet and returns
+        # the id of the first one
+        first = len(self)
+        empty = array("i", [self.NONE]) * count
+        for column in self.columns:
+            column.extend(empty)
+        return first
+
+    def release(self, count):
+        # drops the `count` oldest rows
+        for column in self.columns:
+            del column[:count]
+        self.first += count
+
+    def record(self, iid, stage, cycle):
+        self.columns[self.stages.index(stage)][iid - self.first] = cycle
+
+    def get(self, iid, stage):
+        cycle = self.columns[self.stages.index(stage)][iid - self.first]
+        return None if cycle == self.NONE else cycle
+
+    def rows(self, start=0, stop=None):
+        # (iid, [cycle or None per stage]) for the held instructions in the
+        # range
+        start, stop, _ = slice(start, stop).indices(len(self))
+        first = self.first
+        NONE = self.NONE
+        for iid in range(max(start, first), stop):
+            row = iid - first
+            yield iid, [None if c[row] == NONE else c[row] for c in self.columns]
+
+    def render_table(self, start=0, stop=None, label_width=18, width=6):
+        widths = [max(width, len(stage) + 1) for stage in self.stages]
+        header = f"{'Instr':<{label_width}}" + "".join(
+            f"{stage:<{w}}" for stage, w in zip(self.stages, widths)
+        )
+        lines = [header, "-" * len(header)]
+        for iid, cycles in self.rows(start, stop):
+            lines.append(
+                f"{self.label(iid):<{label_width}}"
+                + "".join(f"{'' if c is None else c:<{w}}" for c, w in zip(cycles, widths))
+            )
+        return "\n".join(lines)
+
+    def render_diagram(self, start=0, stop=None, label_width=18):
+        # One row per instruction and one column per cycle. A stage name
+        # marks the cycle an instruction entered it and "-" every further
+        # cycle it stayed there. The last stage takes one cycle.
+        rows = list(self.rows(start, stop))
+        entered = [c for _, cycles in rows for c in cycles if c is not None]
+        if not entered:
+            return f"{'Instr':<{label_width}}"
+        first, last = min(entered), max(entered)
+        width = max(len(stage) for stage in self.stages) + 1
+        lines = [
+            f"{'Instr':<{label_width}}"
+            + "".join(f"{cycle:<{width}}" for cycle in range(first, last + 1))
+        ]
+        for iid, cycles in rows:
+            cells = [""] * (last - first + 1)
+            stages = [(c, s) for c, s in zip(cycles, self.stages) if c is not None]
+            for k, (cycle, stage) in enumerate(stages):
+                cells[cycle - first] = stage
+                leave = stages[k + 1][0] if k + 1 < len(stages) else cycle + 1
+                for stalled in range(cycle + 1, leave):
+                    cells[stalled - first] = "-"
+            lines.append(
+                f"{self.label(iid):<{label_width}}"
+                + "".join(f"{cell:<{width}}" for cell in cells).rstrip()
+            )
+        return "\n".join(lines)
+
+    def to_csv(self, path, start=0, stop=None):
+        with open(path, "w", newline="") as output:
+            writer = csv.writer(output)
+            writer.writerow(["id", "instr", *self.stages])
+            for iid, cycles in self.rows(start, stop):
+                writer.writerow([iid, self.label(iid), *["" if c is None else c for c in cycles]])
+
+    def to_npz(self, path):
+        # numpy is only needed for this export
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("writing a timeline to .npz needs numpy") from None
+        numpy.savez_compressed(
+            path,
+            **{
+                stage: numpy.frombuffer(column, dtype=numpy.int32)
+                for stage, column in zip(self.stages, self.columns)
+            },
+        )
+
+    def save(self, path):
+        if path.endswith(".npz"):
+            self.to_npz(path)
+        else:
+            self.to_csv(path)
+
+
+def parse_range(text):
+    # "START:STOP" with either end optional, as in a slice
+    start, _, stop = text.partition(":")
+    return int(start) if start else 0, int(stop) if stop else None
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--timeline", help="write per-instruction stage cycles to a .csv or .npz file"
+    )
+    parser.add_argument(
+        "--show",
+        type=parse_range,
+        metavar="START:STOP",
+        help="print the timeline of these instructions",
+    )
+
+
+def report(args, timeline, diagram=False):
+    if args.timeline:
+        timeline.save(args.timeline)
+    if args.show is not None:
+        render = timeline.render_diagram if diagram else timeline.render_table
+        print(render(*args.show))
@@ -1,12 +1,25 @@
-iid = 0
+import argparse
+import heapq
+from collections import defaultdict
+
+import isa
+import profiler
+import timeline
+import tracefile
+import tracer
+from timeline import Timeline
+from tracer import NullTracer
+
+ISA = isa.load()["tomasulo"]
+LOAD = ISA.units.index("load")
+STORE = ISA.units.index("store")
 
 
 class Instruction:
     def __init__(self, op, dest, src1=None, src2=None):
-        global iid
-        self.iid = iid
-        iid += 1
+        self.iid = None  # position in the program, set by Tomasulo
         self.op = op
+        self.opcode = ISA.opcode(op)
         self.dest = dest
         self.src1 = src1
         self.src2 = src2
@@ -19,292 +32,344 @@ class Instruction:
 class Fu:
     accept_cmds = []
     name = None
-    bf_size = 0
-    res_station = []
     reg_status = None
     res_status = None
     inst_status = None
 
-    def __init__(
-        self, name, reg_status, res_status, inst_status, accept_cmds, bf_size=3
-    ):
-        self.res_station = []
+    def __init__(self, name, reg_status, res_status, inst_status, accept_cmds):
         self.name = name
-        self.bf_size = bf_size
         self.reg_status = reg_status
         self.res_status = res_status
         self.inst_status = inst_status
         self.accept_cmds = accept_cmds
+        # opcode -> whether this station takes it
+        self.accepts = [name in accept_cmds for name in ISA.names]
 
     def accept(self, inst, clock):
-        if len(self.res_station) == self.bf_size:
+        if not self.res_status.has_free(self.name):
             return False
-        if inst.op in self.accept_cmds:
-            self.res_station.append(inst)
+        if self.accepts[inst.opcode]:
             self.res_status.create(inst, self.name)
             self.inst_status.issue_inst(inst, clock)
             return True
         return False
 
-    def tick(self, clock):
-        insts = self.res_status.get_ready_insts()
-        ticked = False
-        for inst in insts:
-            if inst.op not in self.accept_cmds:
-                continue
-            if inst.remaining_exec == 0:
-                self.inst_status.move_inst(inst, clock)
-                inst_id = self.res_status.get_inst_id(inst)
-                self.reg_status.update(inst.dest, inst_id)
-            elif self.inst_status.exec_inst(inst, clock):
-                inst.remaining_exec -= 1
-            ticked = True
-        return ticked
+    def step(self, inst, clock):
+        # handles the event of a ready instruction and returns the cycle of
+        # its next one, None once it is done
+        if inst.remaining_exec:
+            self.inst_status.exec_inst(inst, clock)
+            cycle = clock + inst.remaining_exec
+            inst.remaining_exec = 0
+            return cycle
+        done = self.inst_status.move_inst(inst, clock)
+        inst_id = self.res_status.get_inst_id(inst)
+        self.reg_status.update(inst.dest, inst_id)
+        return None if done else clock + 1
 
 
 class MemUnit:
-    load_bf_size = 0
-    store_bf_size = 0
-    load_bf = []
-    store_bf = []
     res_status = None
     reg_status = None
     inst_status = None
 
-    def __init__(self, res_status, reg_status, inst_status, load_buffer, store_buffer):
+    def __init__(self, res_status, reg_status, inst_status):
         self.res_status = res_status
         self.reg_status = reg_status
         self.inst_status = inst_status
-        self.load_bf_size = load_buffer
-        self.store_bf_size = store_buffer
 
     def accept(self, inst, clock):
-        if inst.op == "LD" and len(self.load_bf) == self.load_bf_size:
+        unit = ISA.unit[inst.opcode]
+        if unit == LOAD and not self.res_status.has_free("load"):
             return False
-        if inst.op == "ST" and len(self.store_bf) == self.store_bf_size:
+        if unit == STORE and not self.res_status.has_free("store"):
             return False
-        if inst.op == "LD":
-            self.load_bf.append(inst)
+        if unit == LOAD:
             self.inst_status.issue_inst(inst, clock)
             self.res_status.create(inst, "load")
             return True
-        if inst.op == "ST":
-            self.store_bf.append(inst)
+        if unit == STORE:
             self.inst_status.issue_inst(inst, clock)
             self.res_status.create(inst, "store")
             return True
         return False
 
-    def tick(self, clock):
-        ticked = False
-        ready_insts = self.res_status.get_ready_insts()
-        for inst in ready_insts:
-            if inst.op not in ["LD", "ST"]:
-                continue
-            if inst.remaining_exec == 0:
-                self.inst_status.move_inst(inst, clock)
-                inst_id = self.res_status.get_inst_id(inst)
-                if inst.op == "LD":
-                    self.reg_status.update(inst.dest, inst_id)
-            elif self.inst_status.exec_inst(inst, clock):
-                inst.remaining_exec -= 1
-            ticked = True
-        return ticked
+    def step(self, inst, clock):
+        if inst.remaining_exec:
+            self.inst_status.exec_inst(inst, clock)
+            cycle = clock + inst.remaining_exec
+            inst.remaining_exec = 0
+            return cycle
+        done = self.inst_status.move_inst(inst, clock)
+        inst_id = self.res_status.get_inst_id(inst)
+        if ISA.unit[inst.opcode] == LOAD:
+            self.reg_status.update(inst.dest, inst_id)
+        return None if done else clock + 1
 
 
 class InstStatus:
-    items = []
-
-    class Item:
-        stages = {
-            "ST": ["issue", "EX", "memAccess"],
-            "LD": ["issue", "EX", "memAccess", "CDN"],
-            "ADD": ["issue", "EX", "CDN"],
-            "SUB": ["issue", "EX", "CDN"],
-            "AND": ["issue", "EX", "CDN"],
-            "OR": ["issue", "EX", "CDN"],
-            "XOR": ["issue", "EX", "CDN"],
-        }
-        inst = None
-        issue = None
-        EX = None
-        memAccess = None
-        CDN = None
+    insts = None
+    timeline = None
+    completed = None
 
     def __init__(self, inst_queue):
-        for inst in inst_queue:
-            item = self.Item()
-            item.inst = inst
-            self.items.append(item)
+        # indexed by iid, the instruction's position in the program
+        self.insts = list(inst_queue)
+        # issue/EX/memAccess/CDN cycles, one row per instruction
+        self.timeline = Timeline(["issue", "EX", "memAccess", "CDN"], self.label)
+        self.timeline.add(len(self.insts))
+        self.issued = self.timeline.column("issue")
+        self.executed = self.timeline.column("EX")
+        # opcode -> columns of the stages it goes through
+        self.stage_columns = [
+            [self.timeline.column(stage) for stage in stages] for stages in ISA.stages
+        ]
+        # instructions that reached their last stage since the last drain
+        self.completed = []
+
+    def label(self, row):
+        return str(self.insts[row])
 
     def issue_inst(self, inst, clock):
-        for item in self.items:
-            if item.inst.iid == inst.iid:
-                item.issue = clock
+        self.issued[inst.iid] = clock
 
     def exec_inst(self, inst, clock):
-        for item in self.items:
-            if item.inst.iid == inst.iid and item.EX is None:
-                if clock > item.issue:
-                    item.EX = clock
-                    return True
-                return False
+        if self.executed[inst.iid] == Timeline.NONE:
+            if clock > self.issued[inst.iid]:
+                self.executed[inst.iid] = clock
+                return True
         return False
 
     def move_inst(self, inst, clock):
-        for item in self.items:
-            if item.inst.iid == inst.iid:
-                for stage in item.stages.get(inst.op, []):
-                    if getattr(item, stage) is None:
-                        setattr(item, stage, clock)
-                        break
+        # records the next stage, True if it was the last one
+        columns = self.stage_columns[inst.opcode]
+        for column in columns:
+            if column[inst.iid] == Timeline.NONE:
+                column[inst.iid] = clock
+                if column is columns[-1]:
+                    self.completed.append(inst)
+                    return True
+                return False
+        return False
 
     def finished_insts(self):
-        result = []
-        for item in self.items:
-            last_stage = item.stages[item.inst.op][-1]
-            if getattr(item, last_stage) is not None:
-                result.append(item.inst)
-        return result
-                
-    def display(self):
-        print(f"{'Inst':<18}{'Issue':<12}{'Execute':<12}{'Mem Access':<12}{'CDN'}")
-        for item in self.items:
-            print(
-                f"{item.inst}{'':<12}{str(item.issue):<12}{str(item.EX):<12}{str(item.memAccess):<12}{str(item.CDN)}"
+        # instructions that finished since the last call
+        finished, self.completed = self.completed, []
+        return finished
+
+    def render(self):
+        lines = [f"{'Inst':<18}{'Issue':<12}{'Execute':<12}{'Mem Access':<12}{'CDN'}"]
+        for inst, (_, (issue, ex, mem, cdn)) in zip(self.insts, self.timeline.rows()):
+            lines.append(
+                f"{inst}{'':<12}{str(issue):<12}{str(ex):<12}{str(mem):<12}{str(cdn)}"
             )
+        lines.append("")
+        return "\n".join(lines)
+
+    def display(self):
+        print(self.render(), end="")
 
 
 class ResStatus:
-    items = []
-    inst_queue = []
+    items = None
 
     class Item:
         inst_id = None
         inst = None
         name = None
+        index = None
+        rank = None
         busy = False
         Vj, Vk, Qj, Qk = None, None, None, None
 
     def __init__(self, resource):
+        self.items = []
+        self.by_tag = {}
+        # station name -> heap of free (index, item)
+        self.free = {}
+        # register -> stations whose instruction writes it
+        self.writers = defaultdict(list)
+        # tag -> stations waiting for it on the CDB
+        self.waiting = defaultdict(list)
+        # iid -> station holding the instruction
+        self.station_of = {}
         for r in resource:
+            free = self.free.setdefault(r["name"], [])
             for i in range(1, r["buffer"] + 1):
                 item = self.Item()
                 item.name = r["name"]
                 item.inst_id = f"{r['name']}{i}"
+                item.index = len(self.items)
                 self.items.append(item)
+                self.by_tag[item.inst_id] = item
+                free.append((item.index, item))
+        # order in which the stations' events of one cycle are handled, the
+        # memory unit's first and then the functional units'
+        memory = [item for item in self.items if ISA.unit_config[item.name].get("memory")]
+        others = [item for item in self.items if not ISA.unit_config[item.name].get("memory")]
+        for rank, item in enumerate(memory + others):
+            item.rank = rank
+
+    def has_free(self, name):
+        return bool(self.free[name])
 
     def create(self, inst, name):
-        item = None
-        for item in self.items:
-            if item.name == name and not item.busy:
-                item.busy = True
-                item.inst = inst
-                break
-        Q = []
+        _, item = heapq.heappop(self.free[name])
+        item.busy = True
+        item.inst = inst
+        self.station_of[inst.iid] = item
+        # every instruction in a station was issued before this one
+        producers = self.writers[inst.src1]
+        if inst.src2 != inst.src1:
+            producers = producers + self.writers[inst.src2]
         V = [inst.src1, inst.src2]
-        for element in self.items:
-            if element.inst and inst.iid > element.inst.iid:
-                if element.inst.dest in [inst.src1, inst.src2]:
-                    Q.append(element.inst_id)
-                    V = [i for i in V if i != inst.dest]
+        if producers:
+            V = [i for i in V if i != inst.dest]
+        Q = [element.inst_id for element in sorted(producers, key=lambda e: e.index)]
 
         item.Qj, item.Qk = (Q + [None, None])[:2]
         item.Vj, item.Vk = (V + [None, None])[:2]
+        for tag in Q[:2]:
+            self.waiting[tag].append(item)
+        self.writers[inst.dest].append(item)
+        return item.Qj is None and item.Qk is None
 
     def delete(self, inst_id):
-        for item in self.items:
-            if item.inst_id == inst_id:
-                item.inst = None
-                item.busy = False
-                item.Vj, item.Vk, item.Qj, item.Qk = None, None, None, None
-            if inst_id == item.Qj:
-                item.Qj = None
-            if inst_id == item.Qk:
-                item.Qk = None
+        # frees a station and broadcasts its tag to the stations waiting
+        # for it, returns the instructions that now have both operands
+        item = self.by_tag[inst_id]
+        self.writers[item.inst.dest].remove(item)
+        del self.station_of[item.inst.iid]
+        heapq.heappush(self.free[item.name], (item.index, item))
+        item.inst = None
+        item.busy = False
+        item.Vj, item.Vk, item.Qj, item.Qk = None, None, None, None
+        ready = []
+        for waiter in self.waiting.pop(inst_id, ()):
+            if inst_id == waiter.Qj:
+                waiter.Qj = None
+            if inst_id == waiter.Qk:
+                waiter.Qk = None
+            if waiter.Qj is None and waiter.Qk is None:
+                ready.append(waiter.inst)
+        return ready
 
     def get_inst_id(self, inst):
-        for item in self.items:
-            if item.inst and item.inst.iid == inst.iid:
-                return item.inst_id
-
-    def get_ready_insts(self):
-        return [
-            item.inst
-            for item in self.items
-            if item.Qj is None and item.Qk is None and item.inst
-        ]
+        item = self.station_of.get(inst.iid)
+        return None if item is None else item.inst_id
+
+    def is_ready(self, inst):
+        item = self.station_of[inst.iid]
+        return item.Qj is None and item.Qk is None
+
+    def rank(self, inst):
+        return self.station_of[inst.iid].rank
 
 
 class RegStatus:
-    Qi = {}
+    Qi = None
 
     def update(self, reg, res_id):
         self.Qi[reg] = res_id
 
-    def __init__(self, inst_queue):
-        for item in inst_queue:
-            self.Qi[item.dest] = None
+    def __init__(self):
+        # registers without a pending producer have no entry
+        self.Qi = {}
 
 
 class IssueUnit:
-    fus = []
+    fus = None
     mem_unit = None
-    mem_ops = ["LD", "ST"]
+    mem_ops = (LOAD, STORE)
 
     def __init__(self, fus, mem_unit):
         self.fus = fus
         self.mem_unit = mem_unit
+        # opcode -> unit that takes it, None if no unit does
+        self.route = []
+        for opcode in range(len(ISA.names)):
+            if ISA.unit[opcode] in self.mem_ops:
+                self.route.append(mem_unit)
+            else:
+                self.route.append(next((fu for fu in fus if fu.accepts[opcode]), None))
 
     def accept(self, inst, clock):
-        accepted = False
-        if inst.op in self.mem_ops:
-            accepted = self.mem_unit.accept(inst, clock)
-        for fu in self.fus:
-            accepted = fu.accept(inst, clock) or accepted
-        return accepted
+        unit = self.route[inst.opcode]
+        return unit is not None and unit.accept(inst, clock)
+
+
+def station(name):
+    # reservation station settings of a unit in the ISA description
+    return {"name": name, "accept_cmds": ISA.ops(name), "buffer": ISA.unit_config[name]["buffer"]}
 
 
 class Tomasulo:
     clock = 1
     CDB = None
-    fus = []
+    fus = None
     mem_unit = None
     issue_unit = None
-    inst_queue = []
+    program = None
     status = None
     ALU = [
-        {"name": "adder", "accept_cmds": ["ADD", "SUB"], "buffer": 3},
-        {"name": "multiplier", "accept_cmds": ["MUL"], "buffer": 3},
-        {"name": "general", "accept_cmds": ["AND", "OR", "XOR"], "buffer": 3},
+        station(name) for name in ISA.units if not ISA.unit_config[name].get("memory")
     ]
-    LOAD_RES = {"name": "load", "accept_cmds": ["LD"], "buffer": 2}
-    STORE_RES = {"name": "store", "accept_cmds": ["ST"], "buffer": 2}
+    LOAD_RES = station("load")
+    STORE_RES = station("store")
     RESOURCE = [*ALU, LOAD_RES, STORE_RES]
 
-    def tick(self):
-        progress = True
-        progress = self.mem_unit.tick(self.clock)
-        for fu in self.fus:
-            progress = fu.tick(self.clock) or progress
-        finished_insts = self.inst_status.finished_insts()
-        for inst in finished_insts:
-            inst_id = self.res_status.get_inst_id(inst)
-            self.res_status.delete(inst_id)
-        return progress
-
-    def __init__(self, inst_queue):
+    def __init__(
+        self, inst_queue, tracer=None, buffers=None, latency=None, issue_width=1
+    ):
+        self.tracer = NullTracer() if tracer is None else tracer
+        # instructions issued per cycle, in program order
+        self.issue_width = issue_width
+        # EX cycles per opcode, `latency` overrides them by mnemonic
+        latency = latency or {}
+        self.latency = [
+            latency.get(name, cycles) for name, cycles in zip(ISA.names, ISA.latency)
+        ]
+        if buffers:
+            # reservation station sizes by station name, e.g. {"adder": 4}
+            def resize(r):
+                return {**r, "buffer": buffers.get(r["name"], r["buffer"])}
+
+            self.ALU = [resize(r) for r in self.ALU]
+            self.LOAD_RES = resize(self.LOAD_RES)
+            self.STORE_RES = resize(self.STORE_RES)
+            self.RESOURCE = [*self.ALU, self.LOAD_RES, self.STORE_RES]
+        self.reset(inst_queue)
+
+    def reset(self, inst_queue=None):
+        # Starts over on `inst_queue`, or on the last program when None,
+        # keeping the tracer and station sizes. Every table is rebuilt, so
+        # nothing from the previous run is kept alive.
+        if inst_queue is None:
+            inst_queue = self.program
+        self.program = list(inst_queue)
+        for position, inst in enumerate(self.program):
+            inst.iid = position
+            inst.remaining_exec = self.latency[inst.opcode]
+        self.clock = 0  # the last cycle simulated
+        # set once a cycle starts with every station empty, a finished run
+        # does not resume
+        self.done = False
+        # (cycle, station rank, iid, inst) of every instruction with both
+        # operands, for the next stage it enters
+        self.events = []
+        # the head of the queue found no free station, retried once one is
+        # freed
+        self.issue_blocked = False
         self.res_status = ResStatus(self.RESOURCE)
-        self.reg_status = RegStatus(self.inst_queue)
-        self.inst_status = InstStatus(inst_queue)
+        self.reg_status = RegStatus()
+        self.inst_status = InstStatus(self.program)
         self.mem_unit = MemUnit(
             res_status=self.res_status,
             reg_status=self.reg_status,
             inst_status=self.inst_status,
-            load_buffer=self.LOAD_RES["buffer"],
-            store_buffer=self.STORE_RES["buffer"],
         )
-        self.inst_queue = inst_queue
+        # index in `program` of the next instruction to issue
+        self.head = 0
         self.fus = []
         for item in self.ALU:
             self.fus.append(
@@ -314,22 +379,126 @@ class Tomasulo:
                     reg_status=self.reg_status,
                     inst_status=self.inst_status,
                     accept_cmds=item["accept_cmds"],
-                    bf_size=item["buffer"],
                 )
             )
 
         self.issue_unit = IssueUnit(self.fus, self.mem_unit)
+        # ISA unit index -> unit that steps its instructions
+        fus = {fu.name: fu for fu in self.fus}
+        self.units = [
+            self.mem_unit if unit in (LOAD, STORE) else fus[name]
+            for unit, name in enumerate(ISA.units)
+        ]
+
+    def post(self, cycle, inst):
+        heapq.heappush(self.events, (cycle, self.res_status.rank(inst), inst.iid, inst))
+
+    def issue(self):
+        # up to `issue_width` instructions, stopping at the first one that
+        # finds no free station
+        program = self.program
+        for _ in range(self.issue_width):
+            if self.head == len(program):
+                return
+            inst = program[self.head]
+            if not self.issue_unit.accept(inst, self.clock):
+                self.issue_blocked = True
+                return
+            self.head += 1
+            if self.res_status.is_ready(inst):
+                self.post(self.clock + 1, inst)
+
+    def issuing(self):
+        return self.head < len(self.program) and not self.issue_blocked
+
+    def run(self, until=None):
+        # Event driven: each cycle handles the events posted for it, and
+        # cycles with no event and nothing to issue are skipped unless the
+        # tracer wants every cycle. A cycle that starts with every station
+        # empty ends the run. With `until` the run stops once that cycle has
+        # been simulated, as the pipeline's does, and run resumes it.
+        events = self.events
+        units = self.units
+        while not self.done:
+            if until is not None and self.clock >= until:
+                return
+            clock = self.clock = self.next_cycle(until)
+            if self.issuing():
+                self.issue()
+            busy = bool(self.res_status.station_of)
+            while events and events[0][0] == clock:
+                inst = heapq.heappop(events)[3]
+                cycle = units[ISA.unit[inst.opcode]].step(inst, clock)
+                if cycle is not None:
+                    self.post(cycle, inst)
+            for inst in self.inst_status.finished_insts():
+                inst_id = self.res_status.get_inst_id(inst)
+                for ready in self.res_status.delete(inst_id):
+                    self.post(clock + 1, ready)
+                self.issue_blocked = False
+            self.tracer.cycle(self)
+            self.done = not busy
+        self.tracer.summary(self)
+
+    def next_cycle(self, until):
+        cycle = self.clock + 1
+        if self.tracer.per_cycle or self.issuing():
+            return cycle
+        if self.events:
+            cycle = max(cycle, self.events[0][0])
+        if until is not None:
+            cycle = min(cycle, until)
+        if cycle > self.clock + 1:
+            self.tracer.skipped(self, cycle - self.clock - 1)
+        return cycle
+
+    # timed in a profiled run, see profiler.py
+    PHASES = {
+        "issue": issue,
+        "next_cycle": next_cycle,
+        "fu.accept": Fu.accept,
+        "fu.step": Fu.step,
+        "mem.accept": MemUnit.accept,
+        "mem.step": MemUnit.step,
+        "res.create": ResStatus.create,
+        "res.delete": ResStatus.delete,
+        "inst.move": InstStatus.move_inst,
+    }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["tracer"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.tracer = NullTracer()
+
+    def counters(self):
+        return {"cycles": self.clock, "instructions": len(self.inst_status.insts)}
+
+    def snapshot(self):
+        return {
+            "clock": self.clock,
+            "stations": [
+                {
+                    "name": item.inst_id,
+                    "inst": str(item.inst),
+                    "Qj": item.Qj,
+                    "Qk": item.Qk,
+                }
+                for item in self.res_status.items
+                if item.busy
+            ],
+            "registers": dict(self.reg_status.Qi),
+        }
+
+    def render_cycle(self):
+        # the human-readable log is the final instruction status table
+        return ""
 
-    def run(self):
-        while True:
-            if len(self.inst_queue) > 0:
-                last_inst = self.inst_queue[0]
-                if self.issue_unit.accept(last_inst, self.clock):
-                    self.inst_queue.pop(0)
-            if not self.tick():
-                break
-            self.clock += 1
-        self.inst_status.display()
+    def render_summary(self):
+        return self.inst_status.render()
 
 
 if __name__ == "__main__":
@@ -342,5 +511,18 @@ if __name__ == "__main__":
         Instruction("AND", "R1", "R1", "R2"),
         Instruction("XOR", "R1", "R1", "R2"),
     ]
-    tm = Tomasulo(inst_queue=instrs)
-    tm.run()
+    parser = argparse.ArgumentParser(description="Run the Tomasulo simulator.")
+    parser.add_argument(
+        "--issue-width", type=int, default=1, help="instructions issued per cycle"
+    )
+    parser.add_argument("program", nargs="?", help="trace file to run")
+    tracer.add_arguments(parser)
+    timeline.add_arguments(parser)
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+    if args.program:
+        instrs = tracefile.read_program(tracefile.load(args.program), Instruction)
+    with tracer.from_arguments(args) as trace:
+        tm = Tomasulo(inst_queue=instrs, tracer=trace, issue_width=args.issue_width)
+        profiler.run(args, tm)
+    timeline.report(args, tm.inst_status.timeline)
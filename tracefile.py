@@ -0,0 +1,339 @@
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+from itertools import islice
+
+import isa
+from assembler import Assembler, AssemblerError, InstructionTable
+from instruction import BRANCH_INSTS
+
+# The program format all three engines read, one instruction per line:
+#
+#   [LABEL:] OP [DEST [SRC1 [SRC2]]] [CLOCKS]
+#
+# "_" marks an unused operand, `;` and `#` start a comment, a label on a
+# line of its own belongs to the next instruction and `.clock OP N` sets
+# the clocks of the following OPs. CLOCKS needs all three operands before
+# it. Assembler.parse reads the format for every engine. Branches of the pipeline keep the
+# two registers they compare in DEST and SRC1 and their label in SRC2.
+#
+# A parsed trace is a set of int32 columns, one row per instruction:
+#
+#   ops        opcode, as a symbol code
+#   dests      first operand, symbol code or NONE
+#   sources1   second operand
+#   sources2   third operand
+#   latencies  execution clocks, explicit or as `.clock` / the pipeline ISA
+#              gives them; the scoreboard and Tomasulo use their own tables
+#   targets    row a pipeline branch jumps to, NONE for other instructions
+#   labels     label of the row as an index into `label_names`, or NONE
+#
+# `load` compiles a file once, streaming it through `build`, and caches
+# the columns on disk under the hash of its content and of what compiling
+# depends on: isa.json and the clock table the latencies come from. Later
+# loads map the cached file and the columns are views of the mapping, so
+# startup does not depend on the trace length and processes reading the
+# same trace share its pages.
+#
+# Cache file: header | columns (native int32) | symbols | label names,
+# where the header is MAGIC, version, row count and the byte lengths of
+# the two newline-separated name lists.
+MAGIC = b"TRACE\0"
+VERSION = 1
+HEADER = struct.Struct("<6sBxqqq")
+NONE = -1
+COLUMNS = ("ops", "dests", "sources1", "sources2", "latencies", "targets", "labels")
+
+
+class TraceError(Exception):
+    pass
+
+
+class Labels:
+    # row -> label view of a trace, the shape InstructionTable.labels has
+    def __init__(self, column, names):
+        self.column = column
+        self.names = names
+
+    def get(self, row, default=None):
+        code = self.column[row]
+        return default if code == NONE else self.names[code]
+
+    def items(self):
+        names = self.names
+        return [(row, names[code]) for row, code in enumerate(self.column) if code != NONE]
+
+
+class LabelIndex:
+    # label -> row view of a trace, the shape InstructionTable.label_index
+    # has. Built on the first lookup, as most runs never make one.
+    def __init__(self, labels):
+        self.labels = labels
+        self.rows = None
+
+    def mapping(self):
+        if self.rows is None:
+            self.rows = {label: row for row, label in self.labels.items()}
+        return self.rows
+
+    def get(self, label, default=None):
+        return self.mapping().get(label, default)
+
+    def __contains__(self, label):
+        return label in self.mapping()
+
+    def __getitem__(self, label):
+        return self.mapping()[label]
+
+
+class Trace:
+    def __init__(self, columns, symbols, label_names):
+        for name, column in zip(COLUMNS, columns):
+            setattr(self, name, column)
+        self.symbols = symbols  # symbol code -> name
+        self.label_names = label_names
+
+    def __len__(self):
+        return len(self.ops)
+
+    def symbol(self, code):
+        return None if code == NONE else self.symbols[code]
+
+    def label_map(self):
+        return Labels(self.labels, self.label_names)
+
+    def label_index(self):
+        return LabelIndex(self.label_map())
+
+    def rows(self):
+        # (op, dest, src1, src2) names of every instruction; NONE is -1, so
+        # a None after the symbols decodes it
+        names = self.symbols + [None]
+        decode = names.__getitem__
+        return zip(
+            map(decode, self.ops),
+            map(decode, self.dests),
+            map(decode, self.sources1),
+            map(decode, self.sources2),
+        )
+
+
+class Compiler:
+    # Builds the columns of a trace from the rows Assembler.parse reads and
+    # InstructionTable.extend writes. With `spool`, one file per column,
+    # the table's columns are written out and emptied every CHUNK rows, so
+    # compiling holds a chunk, the symbols, the labels and the branches in
+    # memory however long the trace is. Branch targets are resolved once
+    # every label is known, see `targets`.
+    CHUNK = 1 << 16
+
+    def __init__(self, clocks=None, spool=None):
+        self.assembler = Assembler(clocks)
+        self.table = InstructionTable()
+        self.spool = spool
+        self.label_names = []
+        self.branches = array("i")  # (row, label symbol, line number) triples
+
+    def count(self):
+        return self.table.first + len(self.table.ops)
+
+    def rows(self, lines):
+        # the parsed rows of `lines`, noting the branches among them
+        symbols = self.table.symbols
+        branches = self.branches
+        row = self.count()
+        for parsed in self.assembler.parse(lines):
+            if parsed[2] in BRANCH_INSTS:
+                # interned in the order extend interns a row, so that the
+                # symbol codes do not depend on where the branches are
+                codes = [symbols[field] for field in parsed[2:6]]
+                branches.extend((row, codes[3], parsed[0]))
+            row += 1
+            yield parsed
+
+    def feed(self, lines):
+        rows = self.rows(lines)
+        if self.spool is None:
+            self.table.extend(rows)
+            return
+        while True:
+            self.table.extend(islice(rows, self.CHUNK))
+            if not self.table.ops:
+                break
+            self.flush()
+
+    def columns(self):
+        # the rows the table holds, as the trace's columns
+        table = self.table
+        labels = table.labels
+        label_names = self.label_names
+        targets = array("i", [NONE]) * len(table.ops)
+        label_codes = array("i", [NONE]) * len(table.ops)
+        for row in range(table.first, self.count()):
+            label = labels.get(row)
+            if label is not None:
+                label_codes[row - table.first] = len(label_names)
+                label_names.append(label)
+        return [
+            table.ops,
+            table.operands1,
+            table.operands2,
+            table.operands3,
+            table.execution_clocks,
+            targets,
+            label_codes,
+        ]
+
+    def flush(self):
+        table = self.table
+        count = len(table.ops)
+        for column, output in zip(self.columns(), self.spool):
+            output.write(column)
+            del column[:]
+        table.first += count
+
+    def targets(self):
+        # (row, target row) of every branch
+        names = self.table.symbols.names
+        label_index = self.table.label_index
+        branches = self.branches
+        for k in range(0, len(branches), 3):
+            row, label, line_number = branches[k : k + 3]
+            name = None if label == NONE else names[label]
+            target = label_index.get(name)
+            if target is None:
+                raise AssemblerError(f"undefined label {name}", line_number)
+            yield row, target
+
+
+def parse(lines, clocks=None):
+    # the trace of `lines`, in memory
+    compiler = Compiler(clocks)
+    compiler.feed(lines)
+    columns = compiler.columns()
+    targets = columns[COLUMNS.index("targets")]
+    for row, target in compiler.targets():
+        targets[row] = target
+    return Trace(columns, compiler.table.symbols.names, compiler.label_names)
+
+
+def build(lines, path, clocks=None):
+    # Streams `lines` into a compiled trace file at `path`. The columns are
+    # spooled to temporary files, joined behind the header and the branch
+    # targets patched in place; the file is renamed into place when
+    # complete, so readers never see a partial one.
+    directory = os.path.dirname(path) or "."
+    temporary = f"{path}.{os.getpid()}.tmp"
+    spool = [tempfile.TemporaryFile(dir=directory) for _ in COLUMNS]
+    try:
+        compiler = Compiler(clocks, spool)
+        compiler.feed(lines)
+        count = compiler.count()
+        symbols = names_blob(compiler.table.symbols.names)
+        label_names = names_blob(compiler.label_names)
+        with open(temporary, "w+b") as output:
+            output.write(HEADER.pack(MAGIC, VERSION, count, len(symbols), len(label_names)))
+            for column in spool:
+                column.seek(0)
+                shutil.copyfileobj(column, output)
+            output.write(symbols)
+            output.write(label_names)
+            output.flush()
+            if compiler.branches:
+                offset = HEADER.size + COLUMNS.index("targets") * 4 * count
+                with mmap.mmap(output.fileno(), 0) as data:
+                    targets = memoryview(data)[offset : offset + 4 * count].cast("i")
+                    try:
+                        for row, target in compiler.targets():
+                            targets[row] = target
+                    finally:
+                        targets.release()
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    finally:
+        for column in spool:
+            column.close()
+
+
+def names_blob(names):
+    return "\n".join(names).encode()
+
+
+def names_from(blob):
+    return bytes(blob).decode().split("\n") if len(blob) else []
+
+
+def open_mapped(path):
+    with open(path, "rb") as source:
+        data = memoryview(mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ))
+    magic, version, count, symbols_size, labels_size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise TraceError(f"{path} is not a compiled trace")
+    if version != VERSION:
+        raise TraceError(f"unsupported trace version {version} in {path}")
+    offset = HEADER.size
+    columns = []
+    for _ in COLUMNS:
+        columns.append(data[offset : offset + 4 * count].cast("i"))
+        offset += 4 * count
+    symbols = names_from(data[offset : offset + symbols_size])
+    offset += symbols_size
+    label_names = names_from(data[offset : offset + labels_size])
+    return Trace(columns, symbols, label_names)
+
+
+def cache_dir(variable="TRACE_CACHE", name="pipeline-traces"):
+    # $variable, or `name` under the user's cache directory
+    base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.environ.get(variable, os.path.join(base, name))
+
+
+def read_program(source, instruction):
+    # `instruction(op, dest, src1, src2)` for every row of a Trace or of
+    # the lines of a program, as the scoreboard and Tomasulo read them
+    if not isinstance(source, Trace):
+        source = parse(source)
+    return [instruction(*row) for row in source.rows()]
+
+
+def program_lines(trace):
+    # one "OP DEST SRC1 SRC2" line per row of a trace, so positions in the
+    # program index the list
+    return [" ".join("_" if field is None else field for field in row) for row in trace.rows()]
+
+
+def digest(path):
+    # hash of the content of a file
+    content = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as source:
+        while chunk := source.read(1 << 20):
+            content.update(chunk)
+    return content.hexdigest()
+
+
+def compile_key(clocks=None):
+    # hash of the ISA and the clocks a compiled trace bakes in
+    key = hashlib.blake2b(digest_size=8)
+    with open(isa.PATH, "rb") as spec:
+        key.update(spec.read())
+    key.update(repr(sorted(Assembler(clocks).clocks.items())).encode())
+    return key.hexdigest()
+
+
+def load(path, directory=None, clocks=None):
+    # the trace in `path`, compiled on the first load of its content
+    directory = cache_dir() if directory is None else directory
+    name = f"{digest(path)}-{compile_key(clocks)}.v{VERSION}.trace"
+    cached = os.path.join(directory, name)
+    if not os.path.exists(cached):
+        os.makedirs(directory, exist_ok=True)
+        with open(path) as source:
+            build(source, cached, clocks)
+    return open_mapped(cached)
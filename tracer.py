@@ -0,0 +1,139 @@
+import json
+import sys
+
+
+# Tracers receive the simulator itself and decide how much of its state to
+# look at. A simulator calls `cycle` once per simulated cycle and `summary`
+# once at the end of `run`; it implements:
+#
+#   counters()        final statistics as a flat dict
+#   snapshot()        per-cycle state as a JSON-serializable dict
+#   render_cycle()    per-cycle state as the human-readable text
+#   render_summary()  final statistics as the human-readable text
+#
+# Only the tracer that needs a representation asks for it, so a run with
+# the default NullTracer formats nothing.
+#
+# Tracers with `per_cycle` set want to see every cycle; without it a
+# simulator may fast-forward over cycles in which nothing observable
+# happens and report them through `skipped` instead.
+class NullTracer:
+    per_cycle = False
+
+    def cycle(self, engine):
+        pass
+
+    def skipped(self, engine, cycles):
+        pass
+
+    def summary(self, engine):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CounterTracer(NullTracer):
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.cycles = 0
+        self.counters = {}
+
+    def cycle(self, engine):
+        self.cycles += 1
+
+    def skipped(self, engine, cycles):
+        self.cycles += cycles
+
+    def summary(self, engine):
+        self.counters = engine.counters()
+        if self.stream is not None:
+            for key, value in self.counters.items():
+                self.stream.write(f"{key}: {value}\n")
+
+
+class JSONLinesTracer(NullTracer):
+    per_cycle = True
+
+    def __init__(self, path, flush_every=4096):
+        self.file = open(path, "w")
+        self.flush_every = flush_every
+        self.buffer = []
+
+    def cycle(self, engine):
+        self.buffer.append(json.dumps(engine.snapshot()))
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def summary(self, engine):
+        self.buffer.append(json.dumps({"summary": engine.counters()}))
+        self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write("\n".join(self.buffer))
+            self.file.write("\n")
+            self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class TableTracer(NullTracer):
+    per_cycle = True
+
+    def __init__(self, stream=None, flush_every=256):
+        self.stream = sys.stdout if stream is None else stream
+        self.flush_every = flush_every
+        self.buffer = []
+
+    def cycle(self, engine):
+        self.buffer.append(engine.render_cycle())
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def summary(self, engine):
+        self.buffer.append(engine.render_summary())
+        self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.stream.write("".join(self.buffer))
+            self.buffer.clear()
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+
+TRACERS = ["null", "counters", "jsonl", "table"]
+
+
+def make_tracer(name, path=None):
+    if name == "null":
+        return NullTracer()
+    if name == "counters":
+        return CounterTracer(sys.stdout)
+    if name == "jsonl":
+        if path is None:
+            raise ValueError("the jsonl tracer needs an output path")
+        return JSONLinesTracer(path)
+    if name == "table":
+        return TableTracer()
+    raise ValueError(f"unknown tracer {name!r}, expected one of {TRACERS}")
+
+
+def add_arguments(parser, default="table"):
+    parser.add_argument("--tracer", choices=TRACERS, default=default)
+    parser.add_argument("--trace-file", help="output path for the jsonl tracer")
+
+
+def from_arguments(args):
+    return make_tracer(args.tracer, args.trace_file)